@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Banc d'essai des heuristiques du voyageur de commerce de `corrige_1501`.
+
+Pour chaque nombre de destinations *n*, chaque heuristique et chaque graine
+aléatoire, une ville `Ville.aleatoire(n)` est générée et l'heuristique
+exécutée dans un processus dédié, qui en mesure le temps d'exécution, la
+longueur du trajet obtenu et le pic de mémoire résidente.  Les résultats
+sont écrits (après chaque mesure) dans un fichier JSON ou CSV, selon
+l'extension du fichier de sortie.
+
+Exemple: `python bench_1501.py -n 10 100 1000 10000 -g 3 -o bench.json`
+"""
+
+from __future__ import division
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as N
+
+import matplotlib
+matplotlib.use('Agg')           # Pas d'affichage
+
+import corrige_1501
+
+
+# Heuristiques: nom -> (fonction(ville, initial), trajet initial requis,
+# nombre maximal de destinations par défaut)
+HEURISTIQUES = OrderedDict([
+    ("voisins",
+     (lambda ville, initial: ville.trajet_voisins(0), False, None)),
+    ("optimisation",
+     (lambda ville, initial: ville.optimisation_trajet(initial), True, 3000)),
+    ("opt2",
+     (lambda ville, initial: ville.trajet_opt2(initial), True, 1000)),
+    ("recherche_locale",
+     (lambda ville, initial: ville.recherche_locale(initial), True, None)),
+])
+
+
+def mesure(heuristique, n, graine, file):
+    """
+    Exécute l'`heuristique` sur une ville aléatoire de *n* destinations
+    (initialisée par `graine`), et place dans la `file` le dictionnaire des
+    mesures: temps d'exécution [s], longueur du trajet, pic de mémoire
+    résidente du processus [ko] et son accroissement au cours de
+    l'exécution (hors préparation de la ville et du trajet initial).
+    """
+
+    sys.stdout = open(os.devnull, 'w')  # Heuristiques bavardes
+    fonction, requis, nmax = HEURISTIQUES[heuristique]
+
+    N.random.seed(graine)
+    ville = corrige_1501.Ville()
+    ville.aleatoire(n)
+    initial = ville.trajet_voisins(0) if requis else None
+
+    avant = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    debut = time.time()
+    trajet = fonction(ville, initial)
+    temps = time.time() - debut
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    file.put(dict(temps=temps, longueur=int(trajet.longueur()),
+                  memoire=pic, memoire_execution=pic - avant))
+
+
+def ecriture(nomfichier, meta, resultats):
+    """
+    Écriture des `resultats` (liste de dictionnaires) dans le fichier
+    `nomfichier`, au format CSV si son extension est `.csv`, JSON (avec les
+    métadonnées `meta`) sinon.
+    """
+
+    with open(nomfichier, 'wb') as f:
+        if nomfichier.endswith(".csv"):
+            champs = ['heuristique', 'n', 'graine', 'statut',
+                      'temps', 'longueur', 'memoire', 'memoire_execution']
+            ecrivain = csv.DictWriter(f, champs, restval='')
+            ecrivain.writeheader()
+            ecrivain.writerows(resultats)
+        else:
+            json.dump(dict(meta=meta, resultats=resultats), f, indent=1)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[1],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-n", "--ndest", type=int, nargs='+',
+                        default=[10, 100, 1000, 10000, 100000],
+                        help="Nombres de destinations")
+    parser.add_argument("-H", "--heuristiques", nargs='+',
+                        choices=list(HEURISTIQUES),
+                        default=list(HEURISTIQUES),
+                        help="Heuristiques testées")
+    parser.add_argument("-g", "--graines", type=int, default=1,
+                        help="Nombre de villes (graines 0, 1, ...) par n")
+    parser.add_argument("-d", "--delai", type=float, default=600.,
+                        help="Durée maximale d'une mesure [s]")
+    parser.add_argument("-f", "--force", action='store_true',
+                        help="Ignorer le nombre maximal de destinations "
+                        "des heuristiques")
+    parser.add_argument("-o", "--sortie", default="bench_1501.json",
+                        help="Fichier de sortie (.json ou .csv)")
+    args = parser.parse_args()
+
+    meta = dict(date=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                machine=platform.node(),
+                plateforme=platform.platform(),
+                python=platform.python_version(),
+                numpy=N.__version__,
+                delai=args.delai)
+
+    resultats = []
+    for n in args.ndest:
+        for heuristique in args.heuristiques:
+            nmax = HEURISTIQUES[heuristique][2]
+            for graine in range(args.graines):
+                if nmax is not None and n > nmax and not args.force:
+                    continue
+                resultat = dict(heuristique=heuristique, n=n, graine=graine)
+                file = multiprocessing.Queue()
+                processus = multiprocessing.Process(
+                    target=mesure, args=(heuristique, n, graine, file))
+                processus.start()
+                processus.join(args.delai)
+                if processus.is_alive():
+                    processus.terminate()
+                    processus.join()
+                    resultat['statut'] = "delai"
+                elif processus.exitcode != 0:
+                    resultat['statut'] = "erreur"
+                else:
+                    resultat.update(file.get(), statut="ok")
+                resultats.append(resultat)
+                ecriture(args.sortie, meta, resultats)
+
+                print "{heuristique:>16} n={n:<7d} #{graine}: {statut}".format(
+                    **resultat),
+                if resultat['statut'] == "ok":
+                    print "t={temps:.3f}s L={longueur} " \
+                        "M={memoire_execution}/{memoire} ko".format(**resultat)
+                else:
+                    print
+
+    print "Résultats:", args.sortie
@@ -3,8 +3,16 @@
 
 from __future__ import division
 
-import sys
+import argparse
+import dis
+import hashlib
 import inspect
+import json
+import math
+import os
+import signal
+import sys
+import tempfile
 import traceback
 
 def print_exception(msg, up=1):
@@ -379,10 +387,229 @@ def test_Simulation_energy_2():
     return True
 
 
+# Attributs de la Simulation de la correction dont dépendent ses méthodes
+# __init__, step et run
+AUXILIAIRES = ['INTEGRATEURS', 'derivee', 'advance', 'advance_semi_implicite',
+               'advance_rk4', 'advance_rk45', 'pas_adaptatif',
+               'advance_impact']
+
+def substitue_auxiliaires(force=False, signale=False):
+    """Copie dans code.Simulation les attributs AUXILIAIRES de la
+    correction : seulement ceux qui manquent si force est faux, tous sinon
+    (les méthodes substituées de la correction en dépendent), en signalant
+    dans le rapport ceux de la copie ainsi remplacés si signale est vrai."""
+    for nom in AUXILIAIRES:
+        reference = correction.Simulation.__dict__[nom]
+        if not hasattr(code.Simulation, nom):
+            setattr(code.Simulation, nom, reference)
+        elif force and code.Simulation.__dict__.get(nom) is not reference:
+            if signale:
+                print "-- Simulation.{} de la copie remplacé par celui " \
+                      "de la correction".format(nom)
+            setattr(code.Simulation, nom, reference)
+
+# Barème : tests dans l'ordre de notation (1 point chacun), avec les
+# substitutions par la correction à appliquer *avant* chacun d'eux (en plus
+# de celles des tests précédents), pour ne pas pénaliser deux fois une
+# même erreur
+BAREME = [
+    # test de Vector : 7 points
+    ('test_Vector_init_2', []),
+    ('test_Vector_init_3', []),
+    ('test_Vector_str_2', ['Vector.__init__']),
+    ('test_Vector_add_2', ['Vector.__str__']),
+    ('test_Vector_mul_2', ['Vector.__add__']),
+    ('test_Vector_scal_2', ['Vector.__mul__']),
+    ('test_Vector_norm_2', ['Vector.scal']),
+    # test de Simulation : 9 points
+    ('test_Simulation_init_2', ['Vector.norm']),
+    ('test_Simulation_init_3', []),
+    ('test_Simulation_init_4', []),
+    ('test_Simulation_step_2', ['Simulation.__init__', 'auxiliaires']),
+    ('test_Simulation_run_2', ['Simulation.step', 'auxiliaires!']),
+    ('test_Simulation_maxDistance_2', ['Simulation.run']),
+    ('test_Simulation_maxAltitude_2', []),
+    ('test_Simulation_finalSpeed_2', []),
+    ('test_Simulation_energy_2', []),
+    ]
+
+def substitutions(i):
+    """Substitutions cumulées à appliquer avant le i-ème test du barème."""
+    return sum((subs for _, subs in BAREME[:i + 1]), [])
+
+def substitue(nom, signale=False):
+    """Applique la substitution nom ('Classe.methode', 'auxiliaires' pour
+    les auxiliaires manquants de Simulation, 'auxiliaires!' pour tous,
+    cf. substitue_auxiliaires)."""
+    if nom.startswith('auxiliaires'):
+        substitue_auxiliaires(force=nom.endswith('!'), signale=signale)
+    else:
+        classe, attribut = nom.split('.')
+        setattr(getattr(code, classe), attribut,
+                getattr(correction, classe).__dict__[attribut])
+
+def empreinte(nomfichier):
+    """Empreinte (SHA-1) du contenu du fichier nomfichier."""
+    with open(nomfichier, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def references(objet_code):
+    """Noms globaux et noms d'attributs lus par le code objet_code (et par
+    les fonctions qui y sont imbriquées)."""
+    globaux, attributs = set(), set()
+    octets = [ ord(c) for c in objet_code.co_code ]
+    i = etendu = 0
+    while i < len(octets):
+        op = octets[i]
+        if op < dis.HAVE_ARGUMENT:
+            i += 1
+            continue
+        arg = octets[i + 1] + 256 * octets[i + 2] + etendu
+        i += 3
+        etendu = 0
+        if op == dis.EXTENDED_ARG:
+            etendu = arg << 16
+        elif op in (dis.opmap['LOAD_GLOBAL'], dis.opmap['LOAD_NAME']):
+            globaux.add(objet_code.co_names[arg])
+        elif op == dis.opmap['LOAD_ATTR']:
+            attributs.add(objet_code.co_names[arg])
+    for constante in objet_code.co_consts:
+        if inspect.iscode(constante):
+            g, a = references(constante)
+            globaux |= g
+            attributs |= a
+    return globaux, attributs
+
+def dependances(racines):
+    """Sources des objets racines et, de proche en proche, des fonctions,
+    classes et constantes (en majuscules) du correcteur et de la correction
+    que leur code nomme, ainsi que, pour le code de la correction, des
+    attributs de ses classes qu'il lit (sur-approximation : self.run y
+    désigne Simulation.run, que la méthode soit ou non substituée). Les
+    attributs lus par les tests du correcteur sont ceux de la copie, ou
+    des substitutions (qui font partie des racines)."""
+    modules = (__name__, correction.__name__)
+    classes = [ c for c in vars(correction).values()
+                if inspect.isclass(c) and c.__module__ == correction.__name__ ]
+    sources = set()
+    vus = set()
+    pile = list(racines)
+    while pile:
+        objet = pile.pop()
+        if isinstance(objet, (staticmethod, classmethod)):
+            objet = objet.__func__
+        if isinstance(objet, property):
+            pile.extend(f for f in (objet.fget, objet.fset, objet.fdel) if f)
+            continue
+        if id(objet) in vus:
+            continue
+        vus.add(id(objet))
+        if inspect.isfunction(objet):
+            sources.add(inspect.getsource(objet))
+            globaux, attributs = references(objet.__code__)
+            for nom in globaux:
+                valeur = objet.__globals__.get(nom)
+                if (inspect.isfunction(valeur) or inspect.isclass(valeur)) \
+                   and valeur.__module__ in modules:
+                    pile.append(valeur)
+                elif nom.isupper() and nom in objet.__globals__ \
+                     and not inspect.ismodule(valeur):
+                    pile.append(valeur)
+            if objet.__module__ == correction.__name__:
+                for nom in attributs:
+                    pile.extend(c.__dict__[nom] for c in classes
+                                if nom in c.__dict__)
+        elif inspect.isclass(objet):
+            sources.add(inspect.getsource(objet))
+            pile.extend(v for v in vars(objet).values()
+                        if inspect.isfunction(v) or isinstance(
+                            v, (property, staticmethod, classmethod)))
+        else:                           # Constante
+            sources.add(repr(objet))
+    return sorted(sources)
+
+def cle_test(i):
+    """Clé du i-ème test du barème : empreinte de son nom, des
+    substitutions qui le précèdent et des sources dont il dépend (le test,
+    les attributs substitués de la correction et, de proche en proche, les
+    fonctions et méthodes qu'ils appellent, cf. dependances). Modifier un
+    test ne change donc que sa clé."""
+    nom = BAREME[i][0]
+    racines = [globals()[nom]]
+    for sub in substitutions(i):
+        if sub.startswith('auxiliaires'):
+            racines.extend(correction.Simulation.__dict__[aux]
+                           for aux in AUXILIAIRES)
+        else:
+            classe, attribut = sub.split('.')
+            racines.append(getattr(correction, classe).__dict__[attribut])
+    morceaux = [nom] + substitutions(i) + dependances(racines)
+    return hashlib.sha1("\0".join(morceaux)).hexdigest()
+
+def lance_test(i, delai):
+    """Exécute le i-ème test du barème dans un processus fils, isolé (les
+    substitutions n'y affectent que lui) et limité à delai secondes.
+    Renvoie le pid du fils et le fichier recevant sa sortie."""
+    sortie = tempfile.TemporaryFile()
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:                        # Processus fils
+        reussi = False
+        try:
+            os.dup2(sortie.fileno(), 1)
+            os.dup2(sortie.fileno(), 2)
+            signal.alarm(int(math.ceil(delai)))
+            for sub in substitutions(i):
+                # Remplacements signalés pour le seul test qui les introduit
+                substitue(sub, signale=sub in BAREME[i][1])
+            reussi = globals()[BAREME[i][0]]()
+        except BaseException:
+            print_exception("Correcteur")
+        finally:
+            sys.stdout.flush()
+            os._exit(0 if reussi else 1)
+    return pid, sortie
+
+def execute_tests(indices, nproc=1, delai=10.):
+    """Exécute les tests du barème d'indices donnés, au plus nproc à la
+    fois. Renvoie le dictionnaire indice -> (réussite, sortie)."""
+    resultats = {}
+    attente = list(indices)
+    en_cours = {}
+    while attente or en_cours:
+        while attente and len(en_cours) < nproc:
+            i = attente.pop(0)
+            pid, sortie = lance_test(i, delai)
+            en_cours[pid] = i, sortie
+        pid, statut = os.wait()
+        i, sortie = en_cours.pop(pid)
+        sortie.seek(0)
+        texte = sortie.read().decode('utf-8', 'replace')
+        sortie.close()
+        if os.WIFSIGNALED(statut) and \
+           os.WTERMSIG(statut) == signal.SIGALRM:
+            texte += u"== {}: délai de {} s dépassé\n".format(
+                BAREME[i][0], delai)
+        resultats[i] = (os.WIFEXITED(statut) and
+                        os.WEXITSTATUS(statut) == 0, texte)
+    return resultats
+
 # fonction principale
 if __name__ == '__main__':
 
-    codename = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Correction automatique de l'examen 1411.")
+    parser.add_argument("copie", help="Module (ou fichier) de la copie")
+    parser.add_argument("-j", "--nproc", type=int, default=1,
+                        help="Nombre de tests exécutés simultanément")
+    parser.add_argument("-d", "--delai", type=float, default=10.,
+                        help="Durée maximale de chaque test [s]")
+    parser.add_argument("-c", "--cache",
+                        help="Répertoire du cache des résultats, indexés "
+                        "par l'empreinte de la copie et des tests")
+    args = parser.parse_args()
+
+    codename = args.copie
     if codename.endswith(".py"):
         codename = codename[:-3]
 
@@ -396,35 +623,33 @@ if __name__ == '__main__':
     # Correction officielle
     correction = __import__("corrige_1411")
 
-    note = 0
+    # Résultats en cache, indexés par l'empreinte de la copie
+    cles = [ cle_test(i) for i in range(len(BAREME)) ]
+    cache = {}
+    if args.cache:
+        nomcache = os.path.join(
+            args.cache, empreinte(inspect.getsourcefile(code)) + ".json")
+        if os.path.exists(nomcache):
+            with open(nomcache) as f:
+                cache = json.load(f)
 
-    # test de Vector : 7 points
-    if test_Vector_init_2():  note += 1
-    if test_Vector_init_3():  note += 1
-    code.Vector.__init__ = correction.Vector.__init__.__func__
-    if test_Vector_str_2():   note += 1
-    code.Vector.__str__ = correction.Vector.__str__.__func__
-    if test_Vector_add_2():   note += 1
-    code.Vector.__add__ = correction.Vector.__add__.__func__
-    if test_Vector_mul_2():   note += 1
-    code.Vector.__mul__ = correction.Vector.__mul__.__func__
-    if test_Vector_scal_2():  note += 1
-    code.Vector.scal = correction.Vector.scal.__func__
-    if test_Vector_norm_2():  note += 1
-    code.Vector.norm = correction.Vector.norm.__func__
+    # Chaque test est exécuté isolément, avec les substitutions requises
+    nouveaux = execute_tests([ i for i, cle in enumerate(cles)
+                               if cle not in cache ],
+                             args.nproc, args.delai)
+    for i, (reussi, texte) in nouveaux.items():
+        cache[cles[i]] = dict(test=BAREME[i][0], reussi=reussi,
+                              sortie=texte)
+    if args.cache:
+        if not os.path.isdir(args.cache):
+            os.makedirs(args.cache)
+        # Seuls les résultats des tests actuels sont conservés
+        with open(nomcache, 'w') as f:
+            json.dump(dict((cle, cache[cle]) for cle in cles), f, indent=1)
 
-    # test de Simulation : 9 points
-    if test_Simulation_init_2():  note += 1
-    if test_Simulation_init_3():  note += 1
-    if test_Simulation_init_4():  note += 1
-    code.Simulation.__init__ = correction.Simulation.__init__.__func__
-    if test_Simulation_step_2():  note += 1
-    code.Simulation.step = correction.Simulation.step.__func__
-    if test_Simulation_run_2():   note += 1
-    code.Simulation.run = correction.Simulation.run.__func__
-    if test_Simulation_maxDistance_2(): note += 1
-    if test_Simulation_maxAltitude_2(): note += 1
-    if test_Simulation_finalSpeed_2():  note += 1
-    if test_Simulation_energy_2():  note += 1
-
-    print "Note finale :", note, "/ 16"
+    note = 0
+    for cle in cles:
+        sys.stdout.write(cache[cle]['sortie'].encode('utf-8'))
+        note += cache[cle]['reussi']
+
+    print "Note finale :", note, "/", len(BAREME)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Correction par lot des copies de l'examen 1411 par `correcteur_1411`.
+
+Chaque copie (fichier `.py` du répertoire donné) est corrigée dans un
+processus dédié, sous des limites de temps (de calcul et réel) et de
+mémoire, de sorte qu'une boucle infinie ou une allocation démesurée dans
+une copie ne bloque pas le lot (chaque test y est en outre exécuté
+isolément, avec son propre délai).  Les copies sont corrigées en
+parallèle, et le carnet de notes est écrit (après chaque copie) dans un
+fichier CSV ou JSON, selon l'extension du fichier de sortie.  Avec un
+cache, seuls les tests dont le code (ou celui de la correction dont ils
+dépendent), ou la copie, a changé sont réexécutés.
+
+Exemple: `python correcteur_lot_1411.py copies/ -j 8 -o notes.csv`
+"""
+
+from __future__ import division
+
+import argparse
+import csv
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CORRECTEUR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "correcteur_1411.py")
+
+
+def limites(delai, memoire):
+    """
+    Renvoie la fonction, exécutée dans le processus de correction avant le
+    lancement du correcteur, fixant ses limites de temps de calcul [s] et
+    de mémoire virtuelle [Mo], et le plaçant dans son propre groupe de
+    processus (pour pouvoir l'interrompre avec ses éventuels fils).
+
+    Cette fonction (`preexec_fn`) n'est pas sûre si le processus parent
+    a plusieurs fils d'exécution: les corrections simultanées sont donc
+    lancées depuis des processus distincts (cf. `multiprocessing.Pool`).
+    """
+
+    def fixe_limites():
+        os.setpgrp()
+        cpu = int(delai) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        if memoire:
+            octets = int(memoire * 2**20)
+            resource.setrlimit(resource.RLIMIT_AS, (octets, octets))
+
+    return fixe_limites
+
+
+def reussites(sortie):
+    """
+    Renvoie la liste des tests réussis d'après la `sortie` du correcteur
+    (lignes "++ test_... OK" ou "++ test_... all OK").
+    """
+
+    return re.findall(r"^\+\+ (\w+) (?:all )?OK", sortie, re.M)
+
+
+def corrige(fichier, delai=60., memoire=1024, python=sys.executable,
+            delai_test=10., cache=None):
+    """
+    Corrige la copie `fichier` et renvoie le dictionnaire du résultat:
+    copie, note, total, statut ('ok', 'delai' ou 'erreur'), durée [s],
+    tests réussis et sortie du correcteur.  Les arguments delai_test et
+    cache sont transmis au correcteur.
+    """
+
+    fichier = os.path.abspath(fichier)
+    module = os.path.splitext(os.path.basename(fichier))[0]
+    chemins = [os.path.dirname(fichier)] + [
+        chemin for chemin in os.environ.get("PYTHONPATH", "").split(os.pathsep)
+        if chemin]                      # Un chemin vide désigne le cwd
+    env = dict(os.environ, MPLBACKEND="Agg",
+               PYTHONPATH=os.pathsep.join(chemins))
+    travail = tempfile.mkdtemp(prefix="correction_")  # Fichiers parasites
+
+    commande = [python, "-u", CORRECTEUR, module, "-d", str(delai_test)]
+    if cache:
+        commande += ["-c", os.path.abspath(cache)]
+
+    debut = time.time()
+    with open(os.devnull) as nul:       # subprocess.DEVNULL: Python 3
+        processus = subprocess.Popen(
+            commande, cwd=travail, env=env,
+            stdin=nul, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, preexec_fn=limites(delai, memoire))
+    interrompu = []
+
+    def interrompt():
+        interrompu.append(True)
+        try:
+            os.killpg(processus.pid, signal.SIGKILL)
+        except OSError:                 # Déjà terminé
+            pass
+
+    minuteur = threading.Timer(delai, interrompt)
+    minuteur.start()
+    try:
+        sortie = processus.communicate()[0].decode('utf-8', 'replace')
+    finally:
+        minuteur.cancel()
+        shutil.rmtree(travail, ignore_errors=True)
+    duree = time.time() - debut
+
+    resultat = dict(copie=os.path.basename(fichier), note=0, total=16,
+                    duree=round(duree, 3), sortie=sortie,
+                    reussis=reussites(sortie))
+    note = re.search(r"^Note finale : (\d+) / (\d+)", sortie, re.M)
+    if interrompu or processus.returncode in (-signal.SIGXCPU,
+                                              -signal.SIGKILL):
+        resultat['statut'] = "delai"
+        resultat['note'] = len(resultat['reussis'])  # Tests déjà passés
+    elif note is None:
+        resultat['statut'] = "erreur"
+    else:
+        resultat.update(statut="ok",
+                        note=int(note.group(1)), total=int(note.group(2)))
+
+    return resultat
+
+
+def ecriture(nomfichier, meta, resultats):
+    """
+    Écriture des `resultats` (liste de dictionnaires) dans le fichier
+    `nomfichier`, au format CSV si son extension est `.csv`, JSON (avec les
+    métadonnées `meta` et les sorties du correcteur) sinon.
+    """
+
+    resultats = sorted(resultats, key=lambda r: r['copie'])
+    with open(nomfichier, 'wb') as f:
+        if nomfichier.endswith(".csv"):
+            champs = ['copie', 'note', 'total', 'statut', 'duree', 'reussis']
+            ecrivain = csv.DictWriter(f, champs, extrasaction='ignore')
+            ecrivain.writeheader()
+            for resultat in resultats:
+                ecrivain.writerow(dict(resultat,
+                                       reussis=" ".join(resultat['reussis'])))
+        else:
+            json.dump(dict(meta=meta, resultats=resultats), f, indent=1)
+
+
+def test_corrige(tmpdir):
+    # Sortie réelle du correcteur, sur une copie de la correction
+    copie = tmpdir.join("copie.py")
+    shutil.copy(os.path.join(os.path.dirname(CORRECTEUR), "corrige_1411.py"),
+                str(copie))
+    resultat = corrige(str(copie), delai=120.)
+    assert resultat['statut'] == "ok"
+    assert (resultat['note'], resultat['total']) == (16, 16)
+    assert len(resultat['reussis']) == 16
+    assert "test_Simulation_init_3" in resultat['reussis']  # "all OK"
+
+
+def test_cache(tmpdir):
+    # Modifier un test du barème ne réexécute que lui
+    repertoire = os.path.dirname(CORRECTEUR)
+    for nom in ("correcteur_1411.py", "corrige_1411.py"):
+        shutil.copy(os.path.join(repertoire, nom), str(tmpdir))
+    tmpdir.join("corrige_1411.py").copy(tmpdir.join("copie.py"))
+    correcteur = tmpdir.join("correcteur_1411.py")
+    cache = tmpdir.join("cache")
+
+    def resultats():
+        subprocess.check_output(
+            [sys.executable, str(correcteur), "copie", "-c", str(cache)],
+            cwd=str(tmpdir), env=dict(os.environ, MPLBACKEND="Agg"))
+        fichier, = cache.listdir()
+        with open(str(fichier)) as f:
+            return dict((r['test'], cle) for cle, r in json.load(f).items())
+
+    avant = resultats()
+    correcteur.write(correcteur.read("rb").replace(
+        b"def test_Vector_norm_2():\n",
+        b"def test_Vector_norm_2():\n    # Test modifie\n"), "wb")
+    apres = resultats()
+    assert len(avant) == len(apres) == 16       # Anciennes clés retirées
+    assert [ t for t in avant if avant[t] != apres[t] ] == \
+        ["test_Vector_norm_2"]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[1],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("copies", help="Répertoire des copies (*.py)")
+    parser.add_argument("-j", "--nproc", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Nombre de corrections simultanées")
+    parser.add_argument("-d", "--delai", type=float, default=60.,
+                        help="Durée maximale d'une correction [s]")
+    parser.add_argument("-t", "--delai-test", type=float, default=10.,
+                        help="Durée maximale de chaque test [s]")
+    parser.add_argument("-m", "--memoire", type=float, default=1024.,
+                        help="Mémoire maximale d'une correction [Mo] "
+                        "(0: illimitée)")
+    parser.add_argument("-p", "--python", default=sys.executable,
+                        help="Interpréteur exécutant le correcteur")
+    parser.add_argument("-c", "--cache",
+                        help="Répertoire du cache des résultats des tests")
+    parser.add_argument("-o", "--sortie", default="notes_1411.csv",
+                        help="Carnet de notes (.csv ou .json)")
+    args = parser.parse_args()
+
+    copies = sorted(glob.glob(os.path.join(args.copies, "*.py")))
+    meta = dict(date=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                copies=os.path.abspath(args.copies),
+                delai=args.delai, delai_test=args.delai_test,
+                memoire=args.memoire)
+
+    correction = functools.partial(
+        corrige, delai=args.delai, memoire=args.memoire, python=args.python,
+        delai_test=args.delai_test, cache=args.cache)
+
+    debut = time.time()
+    resultats = []
+    # Des processus (et non des fils d'exécution): cf. limites
+    pool = multiprocessing.Pool(max(args.nproc, 1))
+    for resultat in pool.imap_unordered(correction, copies):
+        resultats.append(resultat)
+        ecriture(args.sortie, meta, resultats)
+        print "{:>30} {statut:>6} {note:2d}/{total} ({duree:.1f}s)".format(
+            resultat['copie'][:30], **resultat)
+    pool.close()
+    pool.join()
+
+    print "{} copies corrigées en {:.1f}s: {}".format(
+        len(resultats), time.time() - debut, args.sortie)
@@ -2,6 +2,11 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import division
+import os
+import struct
+import subprocess
+import sys
+import numpy as N
 import pytest
 
 
@@ -14,9 +19,12 @@ class Vector (object):
     Celle-ci présente un constructeur donnant par défaut le point (0,0), ainsi
     qu'une surcharge des opérateurs addition, multiplication par un entier et
     multiplication scalaire entre vecteurs.  Elle propose également une méthode
-    renvoyant la norme carré du vecteur.
+    renvoyant la norme carré du vecteur, et des versions en place (+=, -=,
+    *= et axpy) des opérateurs, qui ne construisent pas de nouveau Vector.
     """
 
+    __slots__ = ('x', 'y')      # Pas de __dict__ par instance
+
     def __init__(self, x=0, y=0):
         """
         Constructeur de la classe Vector.
@@ -85,6 +93,60 @@ class Vector (object):
 
     __rmul__ = __mul__  # multiplication à droite
 
+    def __iadd__(self, other):
+        """
+        Opérateur addition en place: self devient self + other (TypeError
+        si other n'est pas un vecteur).
+        """
+
+        return self.axpy(1., other)
+
+    def __isub__(self, other):
+        """
+        Opérateur soustraction en place: self devient self - other
+        (TypeError si other n'est pas un vecteur).
+        """
+
+        return self.axpy(-1., other)
+
+    def __imul__(self, s):
+        """
+        Opérateur multiplication en place par un réel: self devient s*self.
+        """
+
+        try:
+            s = float(s)
+        except ValueError:
+            raise TypeError("Le multiplicateur doit"
+                            "être convertible en nombre réel.")
+        self.x *= s
+        self.y *= s
+
+        return self
+
+    def axpy(self, a, other):
+        """
+        Ajoute en place a*other à self, sans vecteur intermédiaire.
+
+        Args:
+                a: un réel
+                other: un autre vecteur
+        Returns:
+                self
+        Raises:
+                TypeError si a n'est pas un réel ou other un vecteur
+        """
+
+        try:
+            x, y = a * other.x, a * other.y
+        except (ValueError, TypeError, AttributeError):
+            raise TypeError("L'opérande doit être un Vector "
+                            "(et le coefficient un réel).")
+        self.x += x
+        self.y += y
+
+        return self
+
     def scal(self, other):
         """
         Opérateur produit scalaire entre deux vecteurs.
@@ -163,6 +225,530 @@ def test_Vector_norm():
     assert_floats(v1.norm(), 2 ** 0.5, tol)
 
 
+def test_Vector_enplace():
+    tol = 1.e-6
+    v = Vector(1, -1)
+    w = v
+    v += Vector(1, 1)
+    v *= 3
+    v -= Vector(1, 0)
+    assert(v is w)
+    assert_floats(v.x, 5, tol)
+    assert_floats(v.y, 0, tol)
+    v.axpy(0.5, Vector(2, 4))
+    assert_floats(v.x, 6, tol)
+    assert_floats(v.y, 2, tol)
+    for mauvais in (1, "a", None):
+        with pytest.raises(TypeError):
+            v += mauvais
+        with pytest.raises(TypeError):
+            v -= mauvais
+    with pytest.raises(TypeError):
+        v.axpy(None, Vector(1, 1))
+    assert v is w
+
+
+# Classe Historique
+class Historique (object):
+
+    """
+    Classe représentant l'historique d'un vecteur à deux dimensions.
+
+    Les coordonnées successives sont stockées dans un tableau NumPy (n, 2)
+    préalloué, dont la capacité double à chaque dépassement.  L'historique
+    se comporte comme une liste de Vector (indexation, longueur, itération,
+    append, extend, pop, + et +=), les vecteurs étant construits à la
+    demande : le correcteur greffe Simulation.__init__ sur les copies, dont
+    les méthodes peuvent utiliser self.r et self.v comme des listes.
+    """
+
+    def __init__(self, v0, capacite=1024):
+        """
+        Constructeur de la classe Historique.
+
+        Args:
+                v0: le vecteur initial
+                capacite: la capacité initiale du tableau
+        """
+
+        self.data = N.empty((max(int(capacite), 1), 2))
+        self.n = 0
+        self.append(v0)
+
+    def __len__(self):
+
+        return self.n
+
+    def reserve(self, n):
+        """
+        Assure une capacité d'au moins n éléments, en doublant si
+        nécessaire la capacité du tableau.
+        """
+
+        if n > len(self.data):
+            data = N.empty((max(2 * len(self.data), n), 2))
+            data[:self.n] = self.data[:self.n]
+            self.data = data
+
+    def append(self, v):
+        """
+        Ajoute le vecteur v à la fin de l'historique.
+        """
+
+        self.reserve(self.n + 1)
+        self.data[self.n] = v.x, v.y
+        self.n += 1
+
+    def extend(self, vecteurs):
+        """
+        Ajoute les vecteurs (itérable de Vector) à la fin de l'historique.
+        """
+
+        for v in list(vecteurs):        # list: h.extend(h) est possible
+            self.append(v)
+
+    def pop(self, i=-1):
+        """
+        Retire et renvoie le vecteur d'indice i (par défaut le dernier).
+        """
+
+        i = self.index(i)
+        v = self[i]
+        self.data[i:self.n - 1] = self.data[i + 1:self.n].copy()
+        self.n -= 1
+
+        return v
+
+    def __iadd__(self, vecteurs):
+
+        self.extend(vecteurs)
+
+        return self
+
+    def __add__(self, vecteurs):
+
+        vecteurs = list(vecteurs)
+        h = Historique(Vector(), capacite=self.n + len(vecteurs))
+        h.data[:self.n] = self.tableau
+        h.n = self.n
+        h.extend(vecteurs)
+
+        return h
+
+    def __radd__(self, vecteurs):
+
+        return list(vecteurs) + list(self)
+
+    def index(self, i):
+        """
+        Renvoie l'indice positif correspondant à l'indice i.
+
+        Raises:
+                IndexError si i est hors de l'historique
+        """
+
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("Indice hors de l'historique")
+
+        return i
+
+    def __getitem__(self, i):
+
+        if isinstance(i, slice):
+            return [ Vector(x, y) for x, y in self.tableau[i].tolist() ]
+
+        return Vector(*self.data[self.index(i)].tolist())
+
+    def __setitem__(self, i, v):
+
+        self.data[self.index(i)] = v.x, v.y
+
+    def __iter__(self):
+
+        for x, y in self.tableau.tolist():
+            yield Vector(x, y)
+
+    @property
+    def tableau(self):
+        """
+        Tableau (n, 2) des coordonnées (sans copie).
+        """
+
+        return self.data[:self.n]
+
+    @property
+    def x(self):
+        """
+        Tableau des abscisses successives.
+        """
+
+        return self.tableau[:, 0]
+
+    @property
+    def y(self):
+        """
+        Tableau des ordonnées successives.
+        """
+
+        return self.tableau[:, 1]
+
+
+# tests unitaires pour Historique
+def test_Historique():
+    tol = 1.e-6
+    h = Historique(Vector(1, 2), capacite=1)
+    for i in range(10):
+        h.append(Vector(i, -i))
+    assert len(h) == 11
+    assert len(h.data) == 16
+    assert_floats(h[0].y, 2, tol)
+    assert_floats(h[-1].x, 9, tol)
+    assert_floats(h.y.min(), -9, tol)
+    assert [ v.x for v in h ][:3] == [1, 0, 1]
+    h[-1] = Vector(3, 4)
+    assert_floats(h[-1].norm(), 5, tol)
+    with pytest.raises(IndexError):
+        h[11]
+    # API de liste, utilisée par les copies corrigées par correcteur_1411
+    h += [Vector(5, 6)]
+    h.extend([Vector(7, 8)])
+    assert len(h) == 13 and h.pop().x == 7 and len(h) == 12
+    g = h + [Vector(0, 1)]
+    assert isinstance(g, Historique) and len(g) == 13 and len(h) == 12
+    assert_floats(g[-1].y, 1, tol)
+    assert len([Vector()] + h) == 13
+    assert_floats(h.pop(0).y, 2, tol)
+    assert_floats(h[0].x, 0, tol)
+
+
+# Copie minimale utilisant self.r et self.v comme des listes (+=)
+COPIE_LISTES = """
+class Vector(object):
+    def __init__(self, x=0, y=0):
+        self.x, self.y = float(x), float(y)
+    def __str__(self):
+        return "({:.2f}, {:.2f})".format(self.x, self.y)
+    def __add__(self, other):
+        return Vector(self.x + other.x, self.y + other.y)
+    def __sub__(self, other):
+        return Vector(self.x - other.x, self.y - other.y)
+    def __mul__(self, s):
+        return Vector(float(s) * self.x, float(s) * self.y)
+    __rmul__ = __mul__
+    def scal(self, other):
+        return self.x * other.x + self.y * other.y
+    def norm(self):
+        return self.scal(self) ** 0.5
+
+class Simulation(object):
+    def __init__(self, m, k, v0, dt):
+        try:
+            self.m, self.k, self.dt = float(m), float(k), float(dt)
+            Vector(v0.x, v0.y)
+        except Exception:
+            raise TypeError("Parametres invalides")
+        if not (self.m > 0 and 0 <= self.k <= 1 and v0.x > 0 and
+                v0.y > 0 and self.dt > 0):
+            raise ValueError("Parametres invalides")
+        self.r, self.v, self.g = [Vector()], [v0], Vector(0, -9.8)
+    def step(self):
+        r, v = self.r[-1], self.v[-1]
+        self.r += [r + v * self.dt]
+        self.v = self.v + [v + (self.g - self.k / self.m * v.norm() * v) *
+                           self.dt]
+    def run(self):
+        while self.r[-1].y >= 0:
+            self.step()
+    def maxDistance(self):
+        return self.r[-1].x
+    def maxAltitude(self):
+        return max([r.y for r in self.r])
+    def finalSpeed(self):
+        return self.v[-1]
+    def energy(self):
+        return [self.m * (-r.scal(self.g) + 0.5 * v.scal(v))
+                for r, v in zip(self.r, self.v)]
+"""
+
+
+@pytest.mark.skipif(sys.version_info[0] > 2,
+                    reason="correcteur_1411 est écrit en Python 2")
+def test_Historique_correcteur(tmpdir):
+    # Régression : Simulation.__init__ (et donc Historique) est greffé sur
+    # les copies, dont step peut utiliser les opérateurs de liste
+    tmpdir.join("copie_listes.py").write(COPIE_LISTES)
+    ici = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, MPLBACKEND="Agg",
+               PYTHONPATH=os.pathsep.join([str(tmpdir), ici]))
+    sortie = subprocess.check_output(
+        [sys.executable, os.path.join(ici, "correcteur_1411.py"),
+         "copie_listes"], cwd=str(tmpdir), env=env)
+    assert "Note finale : 16 / 16" in sortie.decode('utf-8')
+
+
+# Classe Enregistreur
+class Enregistreur (object):
+
+    """
+    Classe enregistrant un flux d'états (lignes d'un tableau de réels) de
+    manière décimée, avec une mémoire bornée.
+
+    C'est la classe Recorder de Exercices/particleSol.py, dupliquée à
+    dessein : ce corrigé doit rester un fichier autonome, en Python 2,
+    importé seul par correcteur_1411 (particleSol est en Python 3).
+
+    À chaque ajout, les agrégats courants (minimum, maximum, premier et
+    dernier état) sont mis à jour sur toutes les lignes.  Seul un état sur
+    `pas` est en revanche stocké, ou bien un échantillon aléatoire uniforme
+    de taille fixe (`reservoir`).  Les états stockés le sont en mémoire ou,
+    si `fichier` est donné, directement dans un fichier `.npy`.  Le dernier
+    état ajouté fait toujours partie du tableau des états stockés.
+    """
+
+    TAILLE_ENTETE = 128         # Taille fixe de l'en-tête .npy [octets]
+
+    def __init__(self, pas=1, reservoir=None, fichier=None, bloc=4096,
+                 graine=None):
+        """
+        Constructeur de la classe Enregistreur.
+
+        Args:
+                pas: stockage d'un état sur pas (indices 0, pas, 2*pas...)
+                reservoir: si donné, stockage d'un échantillon uniforme de
+                        reservoir états (au lieu de la décimation)
+                fichier: si donné, nom du fichier .npy de stockage
+                bloc: nombre d'états accumulés par les simulations avant
+                        chaque ajout
+                graine: graine aléatoire de l'échantillonnage
+        Raises:
+                ValueError si pas, reservoir ou bloc ne sont pas strictement
+                        positifs
+        """
+
+        self.pas = int(pas)
+        self.reservoir = None if reservoir is None else int(reservoir)
+        self.bloc = int(bloc)
+        if (self.pas < 1 or self.bloc < 1 or
+                (self.reservoir is not None and self.reservoir < 1)):
+            raise ValueError("pas, reservoir et bloc doivent être "
+                             "strictement positifs")
+        self.fichier = fichier
+        self.aleatoire = N.random.RandomState(graine)
+
+        self.n = 0                      # Nombre d'états ajoutés
+        self.min = self.max = None      # Agrégats par colonne
+        self.premier = self.dernier = None
+        self.stock = []                 # Blocs stockés (en mémoire)
+        self.nstock = 0                 # Nombre d'états stockés
+        self.supplement = False         # Dernier état stocké en surplus
+        self.flux = None                # Fichier de stockage ouvert
+        self.indices = None             # Indices des états du réservoir
+
+    def __len__(self):
+
+        return self.n
+
+    def ajoute(self, bloc):
+        """
+        Ajoute les états du bloc (tableau (m, ncol), ou ligne ncol).
+        """
+
+        bloc = N.atleast_2d(N.asarray(bloc, dtype=float))
+        if not len(bloc):
+            return
+        if self.supplement:             # Le dernier état n'est plus final
+            self.retire_supplement()
+
+        # Agrégats
+        if self.n == 0:
+            self.premier = bloc[0].copy()
+            self.min = bloc.min(axis=0)
+            self.max = bloc.max(axis=0)
+        else:
+            self.min = N.minimum(self.min, bloc.min(axis=0))
+            self.max = N.maximum(self.max, bloc.max(axis=0))
+        self.dernier = bloc[-1].copy()
+
+        # Stockage
+        if self.reservoir is not None:
+            self.echantillonne(bloc)
+        else:
+            self.stocke(bloc[(-self.n) % self.pas::self.pas])
+        self.n += len(bloc)
+
+    def stocke(self, lignes):
+        """
+        Stocke les lignes en mémoire ou dans le fichier.
+        """
+
+        if not len(lignes):
+            return
+        if self.fichier is None:
+            self.stock.append(lignes.copy())
+        else:
+            if self.flux is None:
+                self.flux = open(self.fichier, 'w+b')
+                self.flux.write(self.entete(0, lignes.shape[1]))
+            self.flux.write(N.ascontiguousarray(lignes, '<f8').tobytes())
+        self.nstock += len(lignes)
+
+    def retire_supplement(self):
+        """
+        Retire le dernier état stocké en surplus par termine().
+        """
+
+        if self.fichier is None:
+            self.stock[-1] = self.stock[-1][:-1]
+        else:
+            self.flux.seek(-8 * len(self.dernier), 2)
+            self.flux.truncate()
+        self.nstock -= 1
+        self.supplement = False
+
+    def echantillonne(self, bloc):
+        """
+        Met à jour le réservoir (algorithme R de Vitter) avec le bloc.
+        """
+
+        k = self.reservoir
+        if self.indices is None:
+            self.echantillon = N.empty((k, bloc.shape[1]))
+            self.indices = N.empty(k, dtype=N.int64)
+        # Remplissage initial
+        i = max(min(k - self.n, len(bloc)), 0)
+        self.echantillon[self.n:self.n + i] = bloc[:i]
+        self.indices[self.n:self.n + i] = N.arange(self.n, self.n + i)
+        # Remplacements: l'état d'indice global j remplace un état du
+        # réservoir avec la probabilité k/(j+1)
+        j = N.arange(self.n + i, self.n + len(bloc))
+        cibles = (self.aleatoire.random_sample(len(j)) * (j + 1)).astype(int)
+        for l in N.flatnonzero(cibles < k):     # Dans l'ordre du flux
+            self.echantillon[cibles[l]] = bloc[i + l]
+            self.indices[cibles[l]] = j[l]
+
+    def termine(self):
+        """
+        Assure que le dernier état ajouté est stocké.
+        """
+
+        if self.n == 0 or self.reservoir is not None or self.supplement:
+            return
+        if (self.n - 1) % self.pas:
+            self.stocke(self.dernier[None])
+            self.supplement = True
+
+    @property
+    def tableau(self):
+        """
+        Tableau des états stockés, par ordre d'ajout (projection en mémoire
+        du fichier, le cas échéant).
+        """
+
+        if self.n == 0:
+            return N.empty((0, 0))
+        if self.reservoir is not None:
+            m = min(self.n, self.reservoir)
+            ordre = N.argsort(self.indices[:m])
+            tableau = self.echantillon[ordre]
+            if self.indices[ordre[-1]] != self.n - 1:
+                tableau = N.vstack((tableau, self.dernier))
+            return tableau
+
+        self.termine()
+        if self.fichier is None:
+            if len(self.stock) > 1:
+                self.stock = [N.concatenate(self.stock)]
+            return self.stock[0]
+        self.flux.seek(0)
+        self.flux.write(self.entete(self.nstock, len(self.dernier)))
+        self.flux.seek(0, 2)
+        self.flux.flush()
+
+        return N.load(self.fichier, mmap_mode='r')
+
+    def derive(self, colonne):
+        """
+        Renvoie la variation de la colonne entre le premier et le dernier
+        état ajoutés.
+        """
+
+        return self.dernier[colonne] - self.premier[colonne]
+
+    def entete(self, n, ncol):
+        """
+        Renvoie l'en-tête .npy (version 1.0, de taille fixe) d'un tableau
+        (n, ncol) de réels.
+        """
+
+        d = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({}, {}), }}"
+        d = d.format(n, ncol).ljust(self.TAILLE_ENTETE - 11) + '\n'
+
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(d)) + d.encode()
+
+    def fermeture(self):
+        """
+        Finalise et ferme le fichier de stockage (écrit le réservoir dans
+        le fichier, le cas échéant).
+        """
+
+        if self.reservoir is not None and self.fichier is not None:
+            N.save(self.fichier, self.tableau)
+        if self.flux is not None:
+            self.tableau
+            self.flux.close()
+            self.flux = None
+
+
+# tests unitaires pour Enregistreur
+def test_Enregistreur(tmpdir):
+    donnees = N.random.RandomState(1).randn(1000, 3)
+    e = Enregistreur(pas=7)
+    for i in range(0, 1000, 64):
+        e.ajoute(donnees[i:i + 64])
+    assert len(e) == 1000
+    assert (e.max == donnees.max(axis=0)).all()
+    assert (e.min == donnees.min(axis=0)).all()
+    assert e.derive(1) == donnees[-1, 1] - donnees[0, 1]
+    attendu = N.vstack((donnees[::7], donnees[-1]))
+    assert (e.tableau == attendu).all()
+    e.ajoute(donnees[:1])               # Le dernier état est remplacé
+    assert len(e.tableau) == len(attendu)
+    assert (e.tableau[-1] == donnees[0]).all()
+    # Stockage dans un fichier
+    nom = str(tmpdir.join("etats.npy"))
+    f = Enregistreur(pas=7, fichier=nom)
+    for i in range(0, 1000, 64):
+        f.ajoute(donnees[i:i + 64])
+    assert (f.tableau == attendu).all()
+    f.ajoute(donnees[:1])
+    f.fermeture()
+    assert (N.load(nom) == e.tableau).all()
+    # Réservoir
+    r = Enregistreur(reservoir=50, graine=0)
+    for i in range(0, 1000, 64):
+        r.ajoute(donnees[i:i + 64])
+    assert len(r.tableau) == 51
+    assert (r.tableau[-1] == donnees[-1]).all()
+    assert N.isin(r.tableau, donnees).all()
+    assert r.indices.max() > 500
+
+
+# Tableau de Butcher de Dormand-Prince (RK45): coefficients des étapes,
+# de la solution d'ordre 5 et de l'estimation d'erreur (ordre 5 - ordre 4)
+DORMAND_PRINCE_A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]]
+DORMAND_PRINCE_B = [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]
+DORMAND_PRINCE_E = [71/57600, 0, -71/16695, 71/1920, -17253/339200,
+                    22/525, -1/40]
+
+
 # Classe Simulation
 class Simulation (object):
 
@@ -171,7 +757,17 @@ class Simulation (object):
     de masse m et à coefficient de frottements et vitesse initiale donnés.
     """
 
-    def __init__(self, m, k, v0, dt):
+    # Historiques à resynchroniser avec l'enregistreur avant lecture
+    desynchronise = False
+
+    # Intégrateurs disponibles: nom -> méthode d'avancement d'un pas
+    INTEGRATEURS = {"euler": "advance",
+                    "semi-implicite": "advance_semi_implicite",
+                    "rk4": "advance_rk4",
+                    "rk45": "advance_rk45"}
+
+    def __init__(self, m, k, v0, dt, methode="euler", impact=False,
+                 tol=1.e-8, enregistreur=None):
         """
         Constructeur de la classe Simulation. Fixe la masse du système,
         la vitesse initiale, le coefficient de frottements et le pas de temps.
@@ -180,13 +776,22 @@ class Simulation (object):
                 m: la masse du système
                 k: le coefficient de frottements
                 v0: la vitesse initiale
-                dt: le pas de temps
+                dt: le pas de temps (pas initial pour 'rk45')
+                methode: l'intégrateur ('euler', 'semi-implicite', 'rk4' ou
+                        'rk45', adaptatif)
+                impact: si vrai, le dernier pas de run() est raccourci pour
+                        s'arrêter exactement au sol (y=0)
+                tol: la tolérance (relative et absolue) de 'rk45'
+                enregistreur: si donné, un Enregistreur recevant les états
+                        (t, x, y, vx, vy, énergie) à la place de l'historique
+                        complet ; self.r et self.v ne contiennent alors que
+                        les états stockés par l'enregistreur
         Raises:
                 TypeError si m, k ou dt ne sont pas des réels,
                         ou si v0 n'est pas un Vector
                 ValueError si m est négatif ou nul, si k n'est pas compris
                         entre 0 et 1, si v0.x ou v0.y est négatif ou nul, si dt
-                        est négatif ou nul
+                        est négatif ou nul, ou si la méthode est inconnue
         """
 
         # Test du type des paramètres
@@ -217,32 +822,336 @@ class Simulation (object):
                              "k doit être compris dans [0,1[")
 
         # Historique des positions et des vitesses
-        self.r = [Vector()]               # Initialisation de la position à 0,0
-        self.v = [v0]                     # Initialisation de la vitesse
-        
+        self.r = Historique(Vector())     # Initialisation de la position à 0,0
+        self.v = Historique(v0)           # Initialisation de la vitesse
+
         self.g = Vector(0, -9.8)          # Accélération de la pesanteur [m/s2]
 
+        # Intégrateur
+        if methode not in self.INTEGRATEURS:
+            raise ValueError("Intégrateur {!r} inconnu".format(methode))
+        self.methode = methode
+        self.impact = bool(impact)
+        self.tol = float(tol)
+        self.h = self.dt                  # Pas courant (adaptatif)
+        self.t = None                     # Instants (pas variable)
+        self.tau = None                   # Durée du dernier pas (impact)
+        if methode == "rk45":
+            self.t = [0.]
+
+        # Enregistrement décimé
+        self.enregistreur = enregistreur
+        if enregistreur is not None:
+            self.t = None
+            self.enregistre(N.array([[0., 0., 0., v0.x, v0.y]]))
+            self.desynchronise = True
+
+    @property
+    def r(self):
+        """
+        Historique des positions (avec un enregistreur, ses états
+        stockés, synchronisés seulement à la lecture).
+        """
+
+        if self.desynchronise:
+            self.synchronise()
+
+        return self._r
+
+    @r.setter
+    def r(self, r):
+
+        self._r = r
+
+    @property
+    def v(self):
+        """
+        Historique des vitesses (cf. r).
+        """
+
+        if self.desynchronise:
+            self.synchronise()
+
+        return self._v
+
+    @v.setter
+    def v(self, v):
+
+        self._v = v
+
+    def derivee(self, x, y, vx, vy):
+        """
+        Renvoie la dérivée temporelle (vx, vy, ax, ay) de l'état
+        (x, y, vx, vy).
+        """
+
+        a = self.k / self.m * (vx * vx + vy * vy) ** 0.5
+
+        return vx, vy, self.g.x - a * vx, self.g.y - a * vy
+
+    def advance(self, x, y, vx, vy, dt=None):
+        """
+        Renvoie les nouvelles position et vitesse (x, y, vx, vy) après un
+        pas de temps (Euler explicite) depuis la position (x, y) et la
+        vitesse (vx, vy).
+        """
+
+        if dt is None:
+            dt = self.dt
+        # Même séquence d'opérations que r + v*dt, g - k/m*|v|*v, v + f*dt
+        a = self.k / self.m * (vx * vx + vy * vy) ** 0.5
+        fx = self.g.x - a * vx
+        fy = self.g.y - a * vy
+
+        return x + dt * vx, y + dt * vy, vx + dt * fx, vy + dt * fy
+
+    def advance_semi_implicite(self, x, y, vx, vy, dt=None):
+        """
+        Comme advance, par le schéma d'Euler semi-implicite (symplectique):
+        la position est avancée avec la nouvelle vitesse.
+        """
+
+        if dt is None:
+            dt = self.dt
+        _, _, fx, fy = self.derivee(x, y, vx, vy)
+        vx = vx + dt * fx
+        vy = vy + dt * fy
+
+        return x + dt * vx, y + dt * vy, vx, vy
+
+    def advance_rk4(self, x, y, vx, vy, dt=None):
+        """
+        Comme advance, par le schéma de Runge-Kutta classique d'ordre 4.
+        """
+
+        if dt is None:
+            dt = self.dt
+        d = self.derivee
+        k1 = d(x, y, vx, vy)
+        k2 = d(x + dt / 2 * k1[0], y + dt / 2 * k1[1],
+               vx + dt / 2 * k1[2], vy + dt / 2 * k1[3])
+        k3 = d(x + dt / 2 * k2[0], y + dt / 2 * k2[1],
+               vx + dt / 2 * k2[2], vy + dt / 2 * k2[3])
+        k4 = d(x + dt * k3[0], y + dt * k3[1],
+               vx + dt * k3[2], vy + dt * k3[3])
+
+        return tuple(s + dt / 6 * (a + 2 * b + 2 * c + e)
+                     for s, a, b, c, e in zip((x, y, vx, vy), k1, k2, k3, k4))
+
+    def advance_rk45(self, x, y, vx, vy, dt=None):
+        """
+        Comme advance, par le schéma de Dormand-Prince (Runge-Kutta
+        emboîté d'ordres 5 et 4).  Renvoie en outre l'estimation de
+        l'erreur locale, normalisée par la tolérance (< 1 si le pas est
+        acceptable).
+        """
+
+        if dt is None:
+            dt = self.dt
+        s = N.array([x, y, vx, vy])
+        ks = N.empty((7, 4))
+        for i, a in enumerate(DORMAND_PRINCE_A):
+            ks[i] = self.derivee(*(s + dt * N.dot(a, ks[:i])))
+        nouveau = s + dt * N.dot(DORMAND_PRINCE_B, ks[:6])
+        ks[6] = self.derivee(*nouveau)
+        erreur = dt * N.dot(DORMAND_PRINCE_E, ks)
+        echelle = self.tol * (1 + N.maximum(N.abs(s), N.abs(nouveau)))
+
+        return tuple(nouveau.tolist()) + (N.abs(erreur / echelle).max(),)
+
+    def pas_adaptatif(self, x, y, vx, vy):
+        """
+        Avance d'un pas accepté par 'rk45', en adaptant le pas courant
+        self.h.  Renvoie le nouvel état (x, y, vx, vy) et la durée du pas.
+        """
+
+        while True:
+            h = self.h
+            nx, ny, nvx, nvy, err = self.advance_rk45(x, y, vx, vy, h)
+            # Facteur de sécurité 0.9, variation du pas dans [1/5, 5]
+            self.h = h * min(5., max(0.2, 0.9 * max(err, 1.e-10) ** -0.2))
+            if err <= 1:
+                return nx, ny, nvx, nvy, h
+
+    def advance_impact(self, x, y, vx, vy, h):
+        """
+        Renvoie l'état au sol (y=0) et la durée tau du pas qui y mène,
+        depuis l'état (x, y, vx, vy) au-dessus du sol, sachant qu'un pas de
+        durée h le fait passer sous le sol.  tau est déterminé par fausse
+        position (variante d'Illinois) sur l'intégrateur lui-même.
+        """
+
+        avance = getattr(self, self.INTEGRATEURS[self.methode])
+
+        def altitude(tau):
+            return avance(x, y, vx, vy, tau)[1]
+
+        a, fa = 0., y
+        b, fb = h, altitude(h)
+        tau, cote = b, 0
+        for i in range(100):
+            if fa == fb:
+                break
+            tau = (a * fb - b * fa) / (fb - fa)
+            f = altitude(tau)
+            if f == 0 or abs(b - a) <= 1.e-15 * h:
+                break
+            if (f > 0) == (fa > 0):
+                a, fa = tau, f
+                if cote == -1:
+                    fb /= 2
+                cote = -1
+            else:
+                b, fb = tau, f
+                if cote == 1:
+                    fa /= 2
+                cote = 1
+
+        return avance(x, y, vx, vy, tau)[:4] + (tau,)
+
     def step(self):
         """
         Calcule un pas de temps et l'ajoute à l'historique.
         """
 
-        # Position et vitesse courantes
-        r = self.r[-1]
-        v = self.v[-1]
+        if self.enregistreur is not None:
+            t, x, y, vx, vy = self.enregistreur.dernier[:5].tolist()
+            if self.methode == "rk45":
+                x, y, vx, vy, h = self.pas_adaptatif(x, y, vx, vy)
+            else:
+                h = self.dt
+                x, y, vx, vy = getattr(
+                    self, self.INTEGRATEURS[self.methode])(x, y, vx, vy)
+            self.enregistre(N.array([[t + h, x, y, vx, vy]]))
+            self.desynchronise = True
+            return
 
-        # Nouvelles position et vitesse
-        self.r.append(r + v * self.dt)
-        force = self.g - self.k / self.m * v.norm() * v
-        self.v.append(v + force * self.dt)
+        # Position et vitesse courantes
+        n = len(self.r)
+        x, y = self.r.data[n - 1].tolist()
+        vx, vy = self.v.data[n - 1].tolist()
+
+        # Nouvelles position et vitesse, écrites en place
+        self.r.reserve(n + 1)
+        self.v.reserve(n + 1)
+        if self.methode == "rk45":
+            x, y, vx, vy, h = self.pas_adaptatif(x, y, vx, vy)
+            self.t.append(self.t[-1] + h)
+        else:
+            x, y, vx, vy = getattr(
+                self, self.INTEGRATEURS[self.methode])(x, y, vx, vy)
+        self.r.data[n] = x, y
+        self.v.data[n] = vx, vy
+        self.r.n = self.v.n = n + 1
 
     def run(self):
         """
-        Calcule le mouvement complet.
+        Calcule le mouvement complet, jusqu'au premier pas sous le sol
+        (y<0), ou exactement jusqu'au sol si self.impact est vrai.
         """
 
-        while self.r[-1].y >= 0:  # Tant que l'on est en l'air (i.e. y>=0)
-            self.step()
+        if self.enregistreur is not None:
+            return self.run_enregistre()
+
+        n = len(self.r)
+        x, y = self.r.data[n - 1].tolist()
+        vx, vy = self.v.data[n - 1].tolist()
+        rdata, vdata = self.r.data, self.v.data
+        adaptatif = self.methode == "rk45"
+        avance = getattr(self, self.INTEGRATEURS[self.methode])
+        h = self.dt
+        while y >= 0:  # Tant que l'on est en l'air (i.e. y>=0)
+            if n == len(rdata):         # Doublement de la capacité
+                self.r.n = self.v.n = n
+                self.r.reserve(n + 1)
+                self.v.reserve(n + 1)
+                rdata, vdata = self.r.data, self.v.data
+            if adaptatif:
+                x, y, vx, vy, h = self.pas_adaptatif(x, y, vx, vy)
+                self.t.append(self.t[-1] + h)
+            else:
+                x, y, vx, vy = avance(x, y, vx, vy)
+            rdata[n] = x, y
+            vdata[n] = vx, vy
+            n += 1
+        self.r.n = self.v.n = n
+
+        if self.impact and n > 1:       # Dernier pas raccourci
+            x, y, vx, vy, self.tau = self.advance_impact(
+                *(rdata[n - 2].tolist() + vdata[n - 2].tolist() + [h]))
+            rdata[n - 1] = x, 0.        # Au sol par construction
+            vdata[n - 1] = vx, vy
+            if adaptatif:
+                self.t[-1] = self.t[-2] + self.tau
+
+    def run_enregistre(self):
+        """
+        Comme run, les états étant transmis par blocs à l'enregistreur.
+        """
+
+        t, x, y, vx, vy = self.enregistreur.dernier[:5].tolist()
+        bloc = N.empty((self.enregistreur.bloc, 5))
+        adaptatif = self.methode == "rk45"
+        avance = getattr(self, self.INTEGRATEURS[self.methode])
+        h = self.dt
+        i = 0
+        while y >= 0:  # Tant que l'on est en l'air (i.e. y>=0)
+            if i == len(bloc):
+                self.enregistre(bloc)
+                i = 0
+            etat = x, y, vx, vy
+            if adaptatif:
+                x, y, vx, vy, h = self.pas_adaptatif(x, y, vx, vy)
+            else:
+                x, y, vx, vy = avance(x, y, vx, vy)
+            t += h
+            bloc[i] = t, x, y, vx, vy
+            i += 1
+
+        if self.impact and i:           # Dernier pas raccourci
+            x, y, vx, vy, self.tau = self.advance_impact(*(etat + (h,)))
+            bloc[i - 1] = t - h + self.tau, x, 0., vx, vy
+        self.enregistre(bloc[:i])
+        self.desynchronise = True
+
+    def enregistre(self, bloc):
+        """
+        Transmet à l'enregistreur le bloc d'états (t, x, y, vx, vy),
+        complété de l'énergie mécanique.
+        """
+
+        x, y, vx, vy = bloc[:, 1:].T
+        e = self.m*(-(self.g.x*x + self.g.y*y) + 0.5*(vx*vx + vy*vy))
+        self.enregistreur.ajoute(N.column_stack((bloc, e)))
+
+    def synchronise(self):
+        """
+        Remplace les historiques de position et de vitesse par les états
+        stockés par l'enregistreur.  Appelée à la lecture des historiques
+        seulement (cf. r et v) : la reconstruction du tableau des états
+        stockés (et, pour un fichier, de son en-tête et de sa projection
+        en mémoire) à chaque pas rendrait l'enregistrement quadratique.
+        """
+
+        tableau = self.enregistreur.tableau
+        self._r.data, self._v.data = tableau[:, 1:3], tableau[:, 3:5]
+        self._r.n = self._v.n = len(tableau)
+        self.desynchronise = False
+
+    def temps(self):
+        """
+        Renvoie le tableau des instants de l'historique.
+        """
+
+        if self.enregistreur is not None:
+            return N.array(self.enregistreur.tableau[:, 0])
+        if self.t is not None:
+            return N.array(self.t)
+        t = N.arange(len(self.r)) * self.dt
+        if self.tau is not None:
+            t[-1] = t[-2] + self.tau
+
+        return t
 
     def maxDistance(self):
         """
@@ -258,7 +1167,10 @@ class Simulation (object):
         de la trajectoire.
         """
 
-        return max([r.y for r in self.r])
+        if self.enregistreur is not None:   # Sur tous les états
+            return self.enregistreur.max[2]
+
+        return self.r.y.max()
 
     def finalSpeed(self):
         """
@@ -269,15 +1181,14 @@ class Simulation (object):
 
     def energy(self):
         """
-        Calcule et renvoie l'historique de l'énergie mécanique au cours
-        du mouvement.
+        Calcule et renvoie l'historique (tableau) de l'énergie mécanique au
+        cours du mouvement.
         """
 
-        def Em(r, v):
-
-            return self.m*(-r.scal(self.g) + 0.5*v.scal(v))
+        r, v = self.r.tableau, self.v.tableau
+        g = N.array([self.g.x, self.g.y])
 
-        return [ Em(r,v) for r,v in zip(self.r, self.v) ]
+        return self.m*(-r.dot(g) + 0.5*(v**2).sum(axis=1))
 
 
 # tests unitaires fournis pour Simulation
@@ -343,6 +1254,225 @@ def test_Simulation_energy():
     assert_floats(en[0], 1, tol)
     assert_floats(en[-1], 1, tol)
 
+
+def test_Simulation_integrateurs():
+    # Sans frottements, la trajectoire est parabolique: RK4 et RK45 sont
+    # exacts et l'impact est localisé à la précision machine
+    for methode in ("rk4", "rk45"):
+        s = Simulation(1, 0., Vector(1, 1), 0.1, methode=methode, impact=True)
+        s.run()
+        assert_floats(s.maxDistance(), 2 / 9.8, 1.e-12)
+        assert s.r[-1].y == 0
+        assert_floats(s.temps()[-1], 2 / 9.8, 1.e-12)
+    # Avec frottements, RK4 au pas 0.1 (9 pas) est plus précis qu'Euler au
+    # pas 1e-3 (776 pas)
+    ref = Simulation(1, 0.1, Vector(3, 4), 0.01, methode="rk45", impact=True,
+                     tol=1.e-12)
+    ref.run()
+    s = Simulation(1, 0.1, Vector(3, 4), 0.1, methode="rk4", impact=True)
+    s.run()
+    assert_floats(s.maxDistance(), ref.maxDistance(), 1.e-5)
+    e = Simulation(1, 0.1, Vector(3, 4), 1.e-3, impact=True)
+    e.run()
+    assert abs(e.maxDistance() - ref.maxDistance()) > 1.e-4
+    assert len(s.r) * 5 < len(e.r)
+    s = Simulation(1, 0.1, Vector(3, 4), 0.01, methode="semi-implicite")
+    s.run()
+    assert_floats(s.maxDistance(), ref.maxDistance(), 0.1)
+    assert s.r[-1].y < 0
+    with pytest.raises(ValueError):
+        Simulation(1, 0.1, Vector(3, 4), 0.01, methode="verlet")
+
+
+def test_Simulation_enregistreur(tmpdir):
+    s = Simulation(2, 0.1, Vector(3, 4), 1.e-3)
+    s.run()
+    for methode, impact in (("euler", False), ("rk4", True)):
+        ref = Simulation(2, 0.1, Vector(3, 4), 1.e-3, methode=methode,
+                         impact=impact)
+        ref.run()
+        e = Enregistreur(pas=10, bloc=64)
+        d = Simulation(2, 0.1, Vector(3, 4), 1.e-3, methode=methode,
+                       impact=impact, enregistreur=e)
+        d.run()
+        assert len(e) == len(ref.r)
+        assert len(d.r) == (len(ref.r) - 1) // 10 + 2
+        assert d.maxDistance() == ref.maxDistance()
+        assert d.maxAltitude() == ref.maxAltitude()
+        assert d.finalSpeed().x == ref.finalSpeed().x
+        assert (d.r.tableau[:-1] == ref.r.tableau[::10]).all()
+        assert_floats(d.temps()[-1], ref.temps()[-1], 1.e-9)
+        assert_floats(e.derive(5), ref.energy()[-1] - ref.energy()[0], 1.e-9)
+        assert_floats(e.min[5], ref.energy().min(), 1.e-9)
+    # Réservoir et fichier, pas à pas
+    nom = str(tmpdir.join("etats.npy"))
+    e = Enregistreur(reservoir=20, fichier=nom, graine=0)
+    d = Simulation(2, 0.1, Vector(3, 4), 1.e-3, enregistreur=e)
+    d.step()
+    assert d.desynchronise              # Pas de synchronisation par pas
+    d.run()
+    assert len(d.r) <= 21
+    assert d.maxDistance() == s.maxDistance()
+    assert (N.diff(d.temps()) > 0).all()
+    e.fermeture()
+    assert (N.load(nom)[:, 1:3] == d.r.tableau).all()
+
+
+
+# Classe Ensemble
+class Ensemble (object):
+
+    """
+    Classe représentant un ensemble de simulations de chute libre,
+    calculées simultanément sous forme de tableaux (n, 2).
+
+    Chaque trajectoire (masse, coefficient de frottements et vitesse
+    initiale propres, pas de temps commun) est avancée exactement comme
+    par Simulation, jusqu'à son premier pas sous le sol (y<0), après quoi
+    elle est figée.  Seuls l'état courant et l'altitude maximale de chaque
+    trajectoire sont conservés.
+    """
+
+    def __init__(self, m, k, v0, dt):
+        """
+        Constructeur de la classe Ensemble.
+
+        Args:
+                m: la (ou les) masse(s) du système
+                k: le (ou les) coefficient(s) de frottements
+                v0: la (ou les) vitesse(s) initiale(s): Vector, liste de
+                        Vector ou tableau (n, 2)
+                dt: le pas de temps (commun)
+        Raises:
+                TypeError si les paramètres ne sont pas numériques
+                ValueError si les paramètres sont invalides (cf. Simulation)
+        """
+
+        try:
+            if hasattr(v0, 'x'):
+                v0 = [v0]
+            if len(v0) and hasattr(v0[0], 'x'):
+                v0 = [ (v.x, v.y) for v in v0 ]
+            v0 = N.array(v0, dtype=float).reshape(-1, 2)
+            m, k, vx, vy = N.broadcast_arrays(
+                N.array(m, dtype=float), N.array(k, dtype=float),
+                v0[:, 0], v0[:, 1])
+            self.dt = float(dt)
+        except (ValueError, TypeError):
+            raise TypeError("Parametres m, k, v0 ou dt de type invalide")
+
+        if not ((m > 0).all() and ((0 <= k) & (k <= 1)).all() and
+                (vx > 0).all() and (vy > 0).all() and self.dt > 0):
+            raise ValueError("m et dt doivent être strictement positifs,"
+                             "k doit être compris dans [0,1[")
+
+        self.m = m.copy()
+        self.k = k.copy()
+        self.r = N.zeros((len(m), 2))            # Positions courantes
+        self.v = N.column_stack((vx, vy))       # Vitesses courantes
+        self.ymax = N.zeros(len(m))             # Altitudes maximales
+        self.nsteps = N.zeros(len(m), dtype=int)  # Nombres de pas
+        self.actives = N.arange(len(m))         # Trajectoires en l'air
+
+        self.g = Vector(0, -9.8)          # Accélération de la pesanteur [m/s2]
+
+    def __len__(self):
+
+        return len(self.m)
+
+    def step(self):
+        """
+        Calcule un pas de temps pour toutes les trajectoires en l'air.
+        """
+
+        i = self.actives
+        x, y = self.r[i, 0], self.r[i, 1]
+        vx, vy = self.v[i, 0], self.v[i, 1]
+
+        # Même séquence d'opérations que Simulation.advance
+        dt = self.dt
+        a = self.k[i] / self.m[i] * (vx * vx + vy * vy) ** 0.5
+        fx = self.g.x - a * vx
+        fy = self.g.y - a * vy
+        y = y + dt * vy
+        self.r[i, 0] = x + dt * vx
+        self.r[i, 1] = y
+        self.v[i, 0] = vx + dt * fx
+        self.v[i, 1] = vy + dt * fy
+        self.ymax[i] = N.maximum(self.ymax[i], y)
+        self.nsteps[i] += 1
+
+        self.actives = i[y >= 0]        # Retrait des trajectoires au sol
+
+    def run(self):
+        """
+        Calcule le mouvement complet de toutes les trajectoires.
+        """
+
+        while len(self.actives):
+            self.step()
+
+    def maxDistance(self):
+        """
+        Renvoie le tableau des distances maximales atteintes avant de
+        retoucher le sol.
+        """
+
+        return self.r[:, 0].copy()
+
+    def maxAltitude(self):
+        """
+        Renvoie le tableau des altitudes maximales atteintes au cours des
+        trajectoires.
+        """
+
+        return self.ymax.copy()
+
+    def finalSpeed(self):
+        """
+        Renvoie le tableau (n, 2) des vitesses en fin de trajectoire.
+        """
+
+        return self.v.copy()
+
+    def energy(self):
+        """
+        Calcule et renvoie le tableau des énergies mécaniques en fin de
+        trajectoire.
+        """
+
+        g = N.array([self.g.x, self.g.y])
+
+        return self.m*(-self.r.dot(g) + 0.5*(self.v**2).sum(axis=1))
+
+
+# tests unitaires pour Ensemble
+def test_Ensemble():
+    params = [(1, 0., Vector(1, 1)), (2, 0.1, Vector(3, 4)),
+              (4, 0.01, Vector(1, 10))]
+    e = Ensemble([p[0] for p in params], [p[1] for p in params],
+                 [p[2] for p in params], 1.e-3)
+    e.run()
+    assert len(e.actives) == 0
+    for i, (m, k, v0) in enumerate(params):
+        s = Simulation(m, k, v0, 1.e-3)
+        s.run()
+        assert e.nsteps[i] == len(s.r) - 1
+        assert e.maxDistance()[i] == s.maxDistance()
+        assert e.maxAltitude()[i] == s.maxAltitude()
+        assert (e.finalSpeed()[i] == s.v.tableau[-1]).all()
+        assert_floats(e.energy()[i], s.energy()[-1], 1.e-9)
+
+
+def test_Ensemble_init():
+    e = Ensemble(N.linspace(1, 2, 5), 0.5, Vector(1, 1), 0.1)
+    assert e.v.shape == (5, 2)
+    with pytest.raises(ValueError):
+        Ensemble([1, -1], 0.5, Vector(1, 1), 0.1)
+    with pytest.raises(TypeError):
+        Ensemble("test", 0.5, Vector(1, 1), 0.1)
+
+
 if __name__ == '__main__':
 
     m = 17.                               # Masse du boulet [kg]
@@ -361,7 +1491,6 @@ if __name__ == '__main__':
     ax2 = fig.add_subplot(2,1,2,
                           xlabel="t [s]", ylabel="Em [kJ]",
                           title=u"Énergie mécanique")
-    ax1.plot([ r.x for r in sim.r ], [ r.y for r in sim.r ])
-    ax2.plot([ i*sim.dt for i in range(len(sim.r)) ],
-             [ e/1e3 for e in sim.energy() ])
+    ax1.plot(sim.r.x, sim.r.y)
+    ax2.plot(sim.temps(), sim.energy()/1e3)
     P.show()
@@ -10,6 +10,10 @@ from __future__ import division
 __author__ = 'Yannick Copin <y.copin@ipnl.in2p3.fr>'
 
 import math
+import multiprocessing
+import random
+import time
+from collections import OrderedDict, deque
 import numpy as N
 import pytest
 
@@ -18,6 +22,112 @@ import matplotlib.pyplot as P
 N.random.seed(123)
 TAILLE = 50
 
+# Format binaire des fichiers de destinations: en-tête (signature, version,
+# nombre de destinations), suivi des coordonnées (entiers 32 bits)
+SIGNATURE = b"VILLEBIN"
+ENTETE = N.dtype([('signature', 'S8'), ('version', '<u4'), ('n', '<u8')])
+
+_VILLE = None   # Ville du processus de calcul (cf. `_initialise_ville`)
+
+
+def _initialise_ville(ville):
+    """
+    Initialise la ville `_VILLE` du processus de calcul courant.
+
+    Utilisée comme `initializer` du pool de processus: la ville est ainsi
+    transmise explicitement à chaque processus fils, que celui-ci soit créé
+    par fork (sans copie) ou par spawn (ville sérialisée une seule fois par
+    processus, et non par tâche).
+    """
+
+    global _VILLE
+
+    _VILLE = ville
+
+
+def _longueur_depart(args):
+    """
+    Retourne la longueur du trajet issu de l'étape initiale `depart` dans
+    la ville `_VILLE` du processus de calcul.
+    """
+
+    depart, opt2 = args
+
+    return _VILLE.trajet_depart(depart, opt2).longueur()
+
+
+def _recuit_chaine(args):
+    """
+    Retourne la longueur et les étapes du meilleur trajet d'une chaîne de
+    recuit simulé dans la ville `_VILLE` du processus de calcul.
+    """
+
+    etapes, chaine, options = args
+    trajet = _VILLE.recuit_chaine(Trajet(_VILLE, etapes), chaine=chaine,
+                                  **options)
+
+    return trajet.longueur(), trajet.etapes
+
+
+def lecture_binaire(nomfichier):
+    """
+    Retourne le tableau (n, 2) des coordonnées des destinations du fichier
+    binaire `nomfichier`, projeté en mémoire (`numpy.memmap`, en mode
+    copie-sur-écriture): les données ne sont lues sur le disque qu'à
+    l'accès.
+    """
+
+    entete = N.fromfile(nomfichier, dtype=ENTETE, count=1)
+    if len(entete) != 1 or entete['signature'][0] != SIGNATURE:
+        raise IOError("Le fichier {!r} est invalide".format(nomfichier))
+
+    return N.memmap(nomfichier, dtype='<i4', mode='c', offset=ENTETE.itemsize,
+                    shape=(int(entete['n'][0]), 2))
+
+
+def lecture_ascii(nomfichier, bloc=2**24):
+    """
+    Retourne le tableau (n, 2) des coordonnées des destinations du fichier
+    ASCII `nomfichier`, lu par blocs d'environ `bloc` octets, chacun étant
+    converti en un appel (cf. `numpy.fromstring`).  Un bloc dont le nombre
+    de valeurs n'est pas le double de son nombre de lignes (commentaires,
+    lignes vides ou mal formées) est relu ligne à ligne (`numpy.loadtxt`).
+
+    Lève une exception `ValueError` si une ligne ne contient pas
+    exactement deux entiers.
+    """
+
+    blocs = []
+    reste = b""
+    with open(nomfichier, 'rb') as f:
+        while True:
+            texte = f.read(bloc)
+            if not texte:
+                texte, reste = reste, b""
+            else:             # Découpage à la dernière fin de ligne
+                texte = reste + texte
+                fin = texte.rfind(b"\n") + 1
+                texte, reste = texte[:fin], texte[fin:]
+            if not texte:
+                if reste:
+                    continue
+                break
+            nlignes = texte.count(b"\n") + (not texte.endswith(b"\n"))
+            valeurs = None
+            if b"#" not in texte:
+                valeurs = N.fromstring(texte, dtype=int, sep=" ")
+            if valeurs is None or len(valeurs) != 2 * nlignes:
+                # Lecture ligne à ligne, qui vérifie le nombre de colonnes
+                valeurs = N.loadtxt(texte.splitlines(), dtype=int, ndmin=2)
+                if valeurs.size == 0:       # Commentaires seuls
+                    continue
+                if valeurs.shape[1] != 2:
+                    raise ValueError("Chaque ligne doit contenir 2 entiers")
+            blocs.append(valeurs.reshape(-1, 2))
+
+    return N.concatenate(blocs) if blocs else N.zeros((0, 2), dtype=int)
+
+
 class Ville(object):
 
     """
@@ -29,6 +139,22 @@ class Ville(object):
 
         self.destinations = N.array([]).reshape(-1, 2)
 
+    @property
+    def destinations(self):
+        """Tableau (n, 2) des coordonnées des destinations."""
+
+        return self._destinations
+
+    @destinations.setter
+    def destinations(self, destinations):
+        """
+        Mise à jour des destinations, et invalidation de la matrice des
+        distances associée.
+        """
+
+        self._destinations = destinations
+        self._distances = None
+
     def __str__(self):
 
         return "Ville: {} destinations ({} trajets)".format(
@@ -42,21 +168,41 @@ class Ville(object):
     def lecture(self, nomfichier="ville.dat"):
         """
         Lecture d'un fichier ASCII donnant les coordonnées des destinations.
+
+        Les fichiers binaires (cf. `ecriture`) sont détectés à leur
+        signature et projetés en mémoire (cf. `lecture_binaire`); les
+        fichiers ASCII sont lus par blocs (cf. `lecture_ascii`).
         """
 
         try:
-            self.destinations = N.loadtxt(nomfichier, dtype=int)
-            if self.destinations.ndim != 2 or self.destinations.shape[1] != 2:
+            with open(nomfichier, 'rb') as f:
+                binaire = (f.read(len(SIGNATURE)) == SIGNATURE)
+            if binaire:
+                destinations = lecture_binaire(nomfichier)
+            else:
+                destinations = lecture_ascii(nomfichier)
+            if destinations.ndim != 2 or destinations.shape[1] != 2:
                 raise IOError
-        except IOError:
+        except (IOError, ValueError):
             raise IOError("Le fichier {!r} est invalide".format(nomfichier))
+        self.destinations = destinations
 
-    def ecriture(self, nomfichier="ville.dat"):
+    def ecriture(self, nomfichier="ville.dat", binaire=False):
         """
         Écriture d'un fichier ASCII avec les coordonnées des destinations.
+
+        Si `binaire`, le fichier est écrit au format binaire: en-tête
+        (`ENTETE`) suivi des coordonnées en entiers 32 bits.
         """
 
-        N.savetxt(nomfichier, self.destinations, fmt='%d')
+        if binaire:
+            entete = N.array([(SIGNATURE, 1, len(self.destinations))],
+                             dtype=ENTETE)
+            with open(nomfichier, 'wb') as f:
+                entete.tofile(f)
+                N.asarray(self.destinations, dtype='<i4').tofile(f)
+        else:
+            N.savetxt(nomfichier, self.destinations, fmt='%d')
 
     def nb_trajets(self):
         """Retourne le nombre total (entier) de trajets: (n-1)!/2."""
@@ -69,56 +215,162 @@ class Ville(object):
         else:
             return 0
 
+    def matrice_distances(self):
+        """
+        Retourne la matrice (n, n) des distances Manhattan-L1 entre toutes
+        les destinations.
+
+        La matrice (entiers 32 bits) est calculée une seule fois par jeu de
+        destinations, puis conservée jusqu'à la prochaine modification de
+        celles-ci.
+        """
+
+        if self._distances is None:
+            dest = N.asarray(self.destinations, dtype=N.int32)
+            ndest = len(dest)
+            distances = N.zeros((ndest, ndest), dtype=N.int32)
+            for x in dest.T:            # Une coordonnée à la fois
+                distances += N.abs(x[:, N.newaxis] - x[N.newaxis, :])
+            self._distances = distances
+
+        return self._distances
+
     def distance(self, i, j):
         """
         Retourne la distance Manhattan-L1 entre les destinations numéro
-        *i* et *j*.
+        *i* et *j* (cf. `distances_paires` pour des tableaux d'indices, sans
+        construire la matrice des distances).
         """
 
-        return N.abs(self.destinations[i] - self.destinations[j]).sum()
+        return self.matrice_distances()[i, j]
+
+    def distances_paires(self, i, j):
+        """
+        Retourne les distances Manhattan-L1 entre les paires de destinations
+        des tableaux d'indices *i* et *j*, élément par élément (version
+        vectorisée de `distance`).
+
+        Les distances sont lues dans la matrice des distances si celle-ci
+        a déjà été calculée, et calculées à partir des coordonnées sinon
+        (ce qui évite de construire la matrice pour les grandes villes).
+        """
+
+        if self._distances is not None:
+            return self._distances[i, j]
+        else:
+            dest = self.destinations
+
+            return N.abs(dest[i] - dest[j]).sum(axis=-1)
 
     def plus_proche(self, i, exclus=[]):
         """
         Retourne la destination la plus proche de la destination *i*, hors les
         destinations de la liste `exclus`.
+
+        `exclus` peut également être un masque booléen de taille n (`True`
+        pour les destinations exclues).
         """
 
-        voisins = [ j for j in range(len(self.destinations))
-                    if j != i and j not in exclus ]
-        distances = [ self.distance(i, j) for j in voisins ]
+        ndest = len(self.destinations)
+        exclus = N.asarray(exclus)
+        if exclus.dtype == bool and exclus.shape == (ndest,):
+            masque = exclus.copy()
+        else:
+            masque = N.zeros(ndest, dtype=bool)
+            masque[exclus.astype(int)] = True
+        masque[i] = True
+        if masque.all():
+            raise ValueError("Aucune destination disponible")
+
+        distances = N.where(masque, N.iinfo(N.int32).max,
+                            self.matrice_distances()[i])
 
-        return voisins[N.argmin(distances)]
+        return N.argmin(distances)
 
-    def trajet_voisins(self, depart=0):
+    def trajet_voisins(self, depart=0, nproc=1):
         """
         Retourne un `Trajet` déterminé selon l'heuristique des plus proches
         voisins (i.e. l'étape suivante est la destination la plus proche hors
         les destinations déjà visitées) en partant de l'étape initiale
         `depart`.
+
+        Si `depart` est None, retourne le plus court des trajets issus de
+        toutes les étapes initiales, calculés sur `nproc` processus (cf.
+        `meilleur_depart`).
+
+        Les destinations restant à visiter sont indexées par une `Grille`.
         """
 
         ndest = len(self.destinations)
         if depart is None:     # Boucle sur tous les départs possibles
-            trajets = [ self.trajet_voisins(depart=i) for i in range(ndest) ]
-            longueurs = [ t.longueur() for t in trajets ]
-
-            return trajets[N.argmin(longueurs)]
+            return self.meilleur_depart(range(ndest), nproc=nproc)
         else:                  # Départ imposé
+            grille = Grille(self.destinations)
+            grille.retire(depart)
             etapes = [depart]
-            while len(etapes) < ndest:
+            while len(grille):
                 i = etapes[-1]
-                j = self.plus_proche(i, exclus=etapes[:-1])
+                j = grille.plus_proche(grille.x[i], grille.y[i])
+                grille.retire(j)
                 etapes.append(j)
 
             return Trajet(self, etapes)
 
-    def optimisation_trajet(self, trajet):
+    def variations_interversion(self, trajet):
+        """
+        Retourne les variations de longueur du `trajet` résultant de chacune
+        des interversions possibles de 2 étapes.
+
+        Seules les (au plus) 4 arêtes affectées par l'interversion sont
+        prises en compte, et le calcul est vectorisé sur l'ensemble des
+        paires.  Retourne les tableaux des indices *i* < *j* des étapes
+        interverties, et des variations de longueur correspondantes.
+        """
+
+        etapes = N.asarray(trajet.etapes)
+        ndest = len(etapes)
+        i, j = N.triu_indices(ndest, 1)        # Toutes les paires i < j
+        if ndest <= 3:       # Tous les trajets bouclés sont équivalents
+            return i, j, N.zeros(len(i), dtype=int)
+
+        d = self.matrice_distances()
+        ti, tj = etapes[i], etapes[j]
+        avant = N.roll(etapes, 1)               # Étape précédente
+        apres = N.roll(etapes, -1)              # Étape suivante
+        # Arêtes retirées et ajoutées
+        delta = (d[avant[i], tj] + d[tj, apres[i]] +
+                 d[avant[j], ti] + d[ti, apres[j]]).astype(int)
+        delta -= (d[avant[i], ti] + d[ti, apres[i]] +
+                  d[avant[j], tj] + d[tj, apres[j]])
+        # Étapes consécutives (y compris la 1ère et la dernière): l'arête
+        # commune (i, j) est conservée
+        contigu = (j == i + 1) | ((i == 0) & (j == ndest - 1))
+        delta[contigu] += 2 * d[ti[contigu], tj[contigu]]
+
+        return i, j, delta
+
+    def optimisation_trajet(self, trajet, variations=True):
         """
         Retourne le trajet le plus court de tous les trajets « voisins » à
         `trajet` (i.e. résultant d'une simple interversion de 2 étapes).
+
+        Si `variations`, les trajets voisins sont évalués à partir des seules
+        variations de longueur (cf. `variations_interversion`), et seul le
+        trajet optimal est construit; sinon, tous les trajets voisins sont
+        construits et leur longueur totale calculée.
         """
 
         ndest = len(self.destinations)
+        if variations:
+            i, j, delta = self.variations_interversion(trajet)
+            if not len(delta):
+                return trajet
+            k = N.argmin(delta)
+            if delta[k] > 0:
+                return trajet
+
+            return trajet.interversion(i[k], j[k])
+
         trajets = [ trajet.interversion(i, j)
                     for i in range(ndest) for j in range(i+1, ndest) ]
         longueurs = [ t.longueur() for t in trajets ]
@@ -128,16 +380,33 @@ class Ville(object):
 
         return opt
 
-    def trajet_opt2(self, trajet=None, maxiter=100):
+    def trajet_opt2(self, trajet=None, maxiter=100, methode="interversion",
+                    departs=None, nproc=1):
         """
         À partir d'un `trajet` initial (par défaut le trajet des plus proches
         voisins), retourne un `Trajet` optimisé de façon itérative par
         interversion successive de 2 étapes.  Le nombre maximum d'itération est
         `maxiter`.
+
+        Si `methode` vaut "inversion", l'optimisation est confiée à la
+        recherche locale 2-opt/Or-opt (cf. `recherche_locale`).
+
+        En l'absence de `trajet` initial, si une liste d'étapes initiales
+        `departs` est fournie, retourne le plus court des trajets optimisés
+        à partir des trajets des plus proches voisins issus de chacune
+        d'entre elles, calculés sur `nproc` processus.
         """
 
+        if trajet is None and departs is not None:
+            return self.meilleur_depart(
+                departs, nproc=nproc,
+                opt2=dict(maxiter=maxiter, methode=methode))
         if trajet is None:
             trajet = self.trajet_voisins()
+        if methode == "inversion":
+            return self.recherche_locale(trajet)
+        elif methode != "interversion":
+            raise ValueError("Méthode {!r} inconnue".format(methode))
 
         for i in range(maxiter):
             opt = self.optimisation_trajet(trajet)
@@ -151,48 +420,802 @@ class Ville(object):
 
         return opt
 
-    def figure(self, trajet=None, ax=None, offset=0):
+    def trajet_depart(self, depart, opt2=None):
         """
-        Visualisation d'une ville et d'un trajet.
+        Retourne le trajet des plus proches voisins issu de l'étape initiale
+        `depart`, optimisé par `trajet_opt2` (avec les options du
+        dictionnaire `opt2`) si celui-ci est spécifié.
         """
 
-        if ax is None:
-            fig = P.figure(figsize=(6,6))
-            ax = fig.add_subplot(1,1,1, aspect='equal',
-                                 xlim=(0, TAILLE), ylim=(0, TAILLE),
-                                 title="{} destinations".format(
-                                     len(self.destinations)))
+        trajet = self.trajet_voisins(depart)
+        if opt2 is not None:
+            trajet = self.trajet_opt2(trajet, **opt2)
+
+        return trajet
+
+    def meilleur_depart(self, departs, nproc=1, opt2=None):
+        """
+        Retourne le plus court des trajets issus de chacune des étapes
+        initiales `departs` (cf. `trajet_depart`).
+
+        Les trajets sont calculés sur `nproc` processus (par défaut, autant
+        que de processeurs si `nproc` est None), qui reçoivent les
+        destinations et la matrice des distances (cf. `calcul_parallele`).
+        Seules les longueurs sont retournées par les processus, le trajet
+        le plus court (le 1er dans l'ordre de `departs` en cas d'égalité)
+        étant recalculé: le résultat ne dépend donc pas du nombre de
+        processus.
+        """
+
+        departs = list(departs)
+        taches = [ (depart, opt2) for depart in departs ]
+        if nproc is None or nproc > 1:
+            self.matrice_distances()    # Calculée une fois, transmise
+        longueurs = self.calcul_parallele(_longueur_depart, taches, nproc)
+
+        return self.trajet_depart(departs[N.argmin(longueurs)], opt2)
+
+    def calcul_parallele(self, fonction, taches, nproc=1):
+        """
+        Retourne la liste des résultats de `fonction` (fonction de module
+        opérant sur la ville `_VILLE`) pour chacune des `taches`, calculés
+        sur `nproc` processus (par défaut, autant que de processeurs si
+        `nproc` est None).
+
+        La ville (destinations, et matrice des distances si elle a été
+        calculée) est transmise aux processus fils par l'initialisation du
+        pool, ce qui ne suppose pas de démarrage par fork.
+        """
+
+        if nproc is None:
+            nproc = multiprocessing.cpu_count()
+        try:
+            if nproc > 1 and len(taches) > 1:
+                pool = multiprocessing.Pool(min(nproc, len(taches)),
+                                            initializer=_initialise_ville,
+                                            initargs=(self,))
+                try:
+                    resultats = pool.map(
+                        fonction, taches,
+                        chunksize=max(1, len(taches) // (4 * nproc)))
+                finally:
+                    pool.terminate()
+            else:
+                _initialise_ville(self)
+                resultats = [ fonction(tache) for tache in taches ]
+        finally:
+            _initialise_ville(None)
+
+        return resultats
+
+    def voisins_proches(self, k=10):
+        """
+        Retourne le tableau (n, k) des indices des *k* plus proches voisins
+        de chaque destination, par distance croissante.
+
+        Les distances sont calculées par blocs de destinations, sans
+        construire la matrice complète des distances.
+        """
+
+        dest = N.asarray(self.destinations, dtype=int)
+        ndest = len(dest)
+        k = min(k, ndest - 1)
+        voisins = N.empty((ndest, max(k, 0)), dtype=int)
+        if k <= 0:
+            return voisins
+
+        bloc = max(1, 2**22 // ndest)  # Nb de destinations par bloc
+        for i in range(0, ndest, bloc):
+            d = N.abs(dest[i:i+bloc, N.newaxis] - dest[N.newaxis]).sum(axis=-1)
+            d[N.arange(len(d)), N.arange(i, i+len(d))] = d.max() + 1
+            proches = N.sort(N.argpartition(d, k - 1, axis=1)[:, :k], axis=1)
+            ordre = N.argsort(N.take_along_axis(d, proches, axis=1),
+                              axis=1, kind='mergesort')
+            voisins[i:i+bloc] = N.take_along_axis(proches, ordre, axis=1)
+
+        return voisins
+
+    def recherche_locale(self, trajet=None, k=10, oropt=True, maxiter=None):
+        """
+        À partir d'un `trajet` initial (par défaut le trajet des plus proches
+        voisins), retourne un `Trajet` localement optimal vis-à-vis des
+        mouvements 2-opt (inversion d'une portion du trajet) et, si `oropt`,
+        Or-opt (déplacement d'un segment de 1 à 3 étapes).
+
+        Les mouvements sont restreints aux *k* plus proches voisins de
+        chaque destination, et seules les destinations dont le voisinage a
+        été modifié sont réexaminées (*don't look bits*), jusqu'à une passe
+        complète sans amélioration.  Le nombre maximum de mouvements est
+        `maxiter` (par défaut illimité).
+        """
+
+        if trajet is None:
+            trajet = self.trajet_voisins()
+
+        etapes = N.array(trajet.etapes, dtype=int)
+        ndest = len(etapes)
+        if ndest < 5:                   # Pas d'amélioration possible
+            return Trajet(self, etapes)
+
+        x, y = N.asarray(self.destinations, dtype=int).T.tolist()
+        voisins = self.voisins_proches(k).tolist()
+        pos = N.empty(ndest, dtype=int)  # Position de chaque destination
+        pos[etapes] = N.arange(ndest)
+
+        def dist(a, b):
+            return abs(x[a] - x[b]) + abs(y[a] - y[b])
+
+        def suiv(a):
+            return int(etapes[(pos[a] + 1) % ndest])
+
+        def prec(a):
+            return int(etapes[pos[a] - 1])
+
+        def inversion(i, j):
+            """Inverse la portion du trajet entre les positions *i* et *j*."""
+
+            l = (j - i) % ndest + 1
+            if 2 * l > ndest:   # Inversion (équivalente) du complémentaire
+                i, j, l = (j + 1) % ndest, (i - 1) % ndest, ndest - l
+            if l < 2:
+                return
+            idx = N.arange(i, i + l) % ndest
+            portion = etapes[idx[::-1]]
+            etapes[idx] = portion
+            pos[portion] = idx
+
+        def echange(a, b, c, d):
+            """Remplace les arêtes (a, b) et (c, d) par (a, c) et (b, d)."""
+
+            if suiv(a) != b:            # Parcours dans l'autre sens
+                a, b, c, d = b, a, d, c
+            inversion(pos[b], pos[c])
+
+        def deplacement(p, s1, s2, nx, u, v, direct):
+            """
+            Déplace le segment s1…s2 (entre p et nx) entre u et v, sous la
+            forme u-s1…s2-v si `direct`, u-s2…s1-v sinon.
+            """
+
+            sens = suiv if suiv(p) == s1 else prec
+            if sens(u) != v:            # Même sens de parcours que p-s1
+                u, v, direct = v, u, not direct
+            echange(p, s1, u, v)        # p-u…nx-s2…s1-v
+            echange(p, u, nx, s2)       # p-nx…u-s2…s1-v
+            if direct and s1 != s2:
+                echange(u, s2, s1, v)   # p-nx…u-s1…s2-v
+
+        def ameliore_2opt(a):
+            for sens in (suiv, prec):
+                b = sens(a)
+                dab = dist(a, b)
+                for c in voisins[a]:
+                    dac = dist(a, c)
+                    if dac >= dab:
+                        break
+                    d = sens(c)
+                    if c == b or d == a:
+                        continue
+                    gain = dab + dist(c, d) - dac - dist(b, d)
+                    if gain > 0:
+                        if sens is suiv:
+                            echange(a, b, c, d)
+                        else:
+                            echange(b, a, d, c)
+                        return gain, (a, b, c, d)
+
+        def ameliore_oropt(a):
+            for l in (1, 2, 3):
+                if l + 4 > ndest:
+                    break
+                # Segment débutant ou (si l > 1) s'achevant en a
+                for sens, inverse in ((suiv, prec), (prec, suiv))[:min(l, 2)]:
+                    segment = [a]
+                    while len(segment) < l:
+                        segment.append(sens(segment[-1]))
+                    s1, s2 = a, segment[-1]
+                    p, nx = inverse(s1), sens(s2)
+                    retrait = dist(p, s1) + dist(s2, nx) - dist(p, nx)
+                    for c in voisins[s1]:
+                        if dist(c, s1) >= retrait:
+                            break
+                        for u, v in ((prec(c), c), (c, suiv(c))):
+                            if (u in segment or v in segment or
+                                u in (p, nx) or v in (p, nx)):
+                                continue
+                            duv = dist(u, v)
+                            direct = dist(u, s1) + dist(s2, v) - duv
+                            indirect = dist(u, s2) + dist(s1, v) - duv
+                            gain = retrait - min(direct, indirect)
+                            if gain > 0:
+                                deplacement(p, s1, s2, nx, u, v,
+                                            direct <= indirect)
+                                return gain, (p, nx, s1, s2, u, v)
+
+        longueur = int(self.distances_paires(etapes, N.roll(etapes, -1)).sum())
+        l0 = longueur
+        niter = 0
+        while True:
+            # Passe complète: les don't look bits seuls ne garantissent pas
+            # l'optimum local (un mouvement peut devenir améliorant sans que
+            # le voisinage de la destination concernée ait été modifié)
+            file = deque(etapes.tolist())  # Destinations à (ré)examiner
+            actif = [True] * ndest
+            niter0 = niter
+            while file and (maxiter is None or niter < maxiter):
+                a = file.popleft()
+                actif[a] = False
+                mouvement = ameliore_2opt(a) or (oropt and ameliore_oropt(a))
+                if mouvement:
+                    gain, modifiees = mouvement
+                    longueur -= gain
+                    niter += 1
+                    for b in modifiees:
+                        if not actif[b]:
+                            actif[b] = True
+                            file.append(b)
+            if niter == niter0 or file:     # Optimum local, ou maxiter
+                break
+        print "Recherche locale: L={} -> {} en {} iterations".format(
+            l0, longueur, niter)
+
+        return Trajet(self, etapes, longueur=longueur)
+
+    def recuit(self, trajet=None, nchaines=1, nproc=1, **options):
+        """
+        À partir d'un `trajet` initial (par défaut le trajet des plus proches
+        voisins), retourne le plus court des trajets obtenus par `nchaines`
+        chaînes indépendantes de recuit simulé (cf. `recuit_chaine` pour
+        les `options`), réparties sur `nproc` processus.
+        """
+
+        if trajet is None:
+            trajet = self.trajet_voisins()
+
+        taches = [ (trajet.etapes, chaine, options)
+                   for chaine in range(nchaines) ]
+        resultats = self.calcul_parallele(_recuit_chaine, taches, nproc)
+        longueurs = [ longueur for longueur, etapes in resultats ]
+        longueur, etapes = resultats[N.argmin(longueurs)]
+
+        return Trajet(self, etapes, longueur=longueur)
+
+    def recuit_chaine(self, trajet, duree=10., maxiter=None, t0=None, tf=None,
+                      refroidissement="geometrique",
+                      mouvements=("interversion", "inversion", "insertion"),
+                      periode=1., sauvegarde=None, graine=None, chaine=0):
+        """
+        Retourne le meilleur `Trajet` rencontré par une chaîne de recuit
+        simulé issue de `trajet`.
+
+        À chaque itération, un mouvement tiré parmi `mouvements`
+        (interversion de 2 étapes, inversion d'une portion du trajet,
+        insertion d'une étape ailleurs dans le trajet) est évalué à partir
+        des seules arêtes affectées, puis accepté s'il raccourcit le trajet,
+        ou avec une probabilité exp(-ΔL/T) sinon.
+
+        La chaîne dure `duree` secondes et/ou `maxiter` itérations.  La
+        température décroît de `t0` (par défaut estimée pour accepter
+        environ la moitié des dégradations) à `tf` (par défaut `t0`/1000)
+        selon le `refroidissement` "geometrique" ou "lineaire", ou selon
+        une fonction de la fraction *f* ∈ [0, 1] de la chaîne écoulée.
+
+        Toutes les `periode` secondes, la progression est affichée et, si
+        `sauvegarde` est spécifié (nom de fichier, formaté avec le numéro
+        de `chaine`), le meilleur trajet est sauvegardé au format `.npy`.
+        Le générateur aléatoire est initialisé par `graine` + `chaine`.
+        """
+
+        if duree is None and maxiter is None:
+            raise ValueError("La durée ou le nombre d'itérations est requis")
+
+        etapes = trajet.etapes.tolist()
+        ndest = len(etapes)
+        if ndest < 5:                   # Pas d'amélioration possible
+            return Trajet(self, etapes)
+
+        x, y = N.asarray(self.destinations, dtype=int).T.tolist()
+        alea = random.Random(None if graine is None else graine + chaine)
+
+        def dist(a, b):
+            return abs(x[a] - x[b]) + abs(y[a] - y[b])
+
+        def aretes(positions):
+            return sum( dist(etapes[k], etapes[(k + 1) % ndest])
+                        for k in set(k % ndest for k in positions) )
+
+        def paire():
+            i = alea.randrange(ndest)
+            j = alea.randrange(ndest - 1)
+            return (i, j + 1) if j >= i else (j, i)
+
+        # Mouvements: tirage des positions (i, j), variation de longueur et
+        # application
+
+        def variation_interversion(i, j):
+            positions = (i - 1, i, j - 1, j)
+            avant = aretes(positions)
+            etapes[i], etapes[j] = etapes[j], etapes[i]
+            apres = aretes(positions)
+            etapes[i], etapes[j] = etapes[j], etapes[i]
+            return apres - avant
+
+        def interversion(i, j):
+            etapes[i], etapes[j] = etapes[j], etapes[i]
+
+        def variation_inversion(i, j):
+            if i == 0 and j == ndest - 1:   # Trajet complet inversé
+                return 0
+            a, b = etapes[i - 1], etapes[i]
+            c, d = etapes[j], etapes[(j + 1) % ndest]
+            return dist(a, c) + dist(b, d) - dist(a, b) - dist(c, d)
+
+        def inversion(i, j):
+            etapes[i:j+1] = etapes[i:j+1][::-1]
+
+        def tirage_insertion():
+            i = alea.randrange(ndest)
+            j = i
+            while j in (i, (i - 1) % ndest):
+                j = alea.randrange(ndest)
+            return i, j
+
+        def variation_insertion(i, j):  # Étape i déplacée après l'étape j
+            a, b, c = etapes[i - 1], etapes[i], etapes[(i + 1) % ndest]
+            p, q = etapes[j], etapes[(j + 1) % ndest]
+            return (dist(a, c) - dist(a, b) - dist(b, c) +
+                    dist(p, b) + dist(b, q) - dist(p, q))
+
+        def insertion(i, j):
+            b = etapes.pop(i)
+            etapes.insert(j if j > i else j + 1, b)
+
+        table = {"interversion": (paire, variation_interversion, interversion),
+                 "inversion": (paire, variation_inversion, inversion),
+                 "insertion": (tirage_insertion, variation_insertion,
+                               insertion)}
+        try:
+            mouvements = [ table[mouvement] for mouvement in mouvements ]
+        except KeyError as err:
+            raise ValueError("Mouvement {} inconnu".format(err))
+
+        if t0 is None:        # Dégradation moyenne d'un mouvement aléatoire
+            hausses = []
+            for k in range(200):
+                tirage, variation, applique = alea.choice(mouvements)
+                hausses.append(max(variation(*tirage()), 0))
+            t0 = max(sum(hausses) / len(hausses), 1) / math.log(2)
+        if tf is None:
+            tf = t0 / 1000
+
+        if refroidissement == "geometrique":
+            temperature = lambda f: t0 * (tf / t0) ** f
+        elif refroidissement == "lineaire":
+            temperature = lambda f: t0 + (tf - t0) * f
+        elif callable(refroidissement):
+            temperature = refroidissement
+        else:
+            raise ValueError("Refroidissement {!r} inconnu".format(
+                refroidissement))
+
+        longueur = l0 = trajet.longueur()
+        meilleur, meilleures = longueur, etapes[:]
+        en_attente = False   # Meilleur trajet courant non encore copié
+        debut = time.time()
+        prochain = debut + periode
+        niter = 0
+        while True:
+            if niter % 256 == 0:        # Avancement de la chaîne
+                maintenant = time.time()
+                f = max((maintenant - debut) / duree if duree else 0,
+                        niter / maxiter if maxiter else 0)
+                if f >= 1:
+                    break
+                T = temperature(f)
+                if maintenant >= prochain:
+                    prochain += periode
+                    if en_attente:
+                        meilleures, en_attente = etapes[:], False
+                    print "Recuit #{}: t={:.1f}s T={:.3g} L={} ({})".format(
+                        chaine, maintenant - debut, T, longueur, meilleur)
+                    if sauvegarde:
+                        N.save(sauvegarde.format(chaine),
+                               N.array(meilleures, dtype=N.int32))
+
+            tirage, variation, applique = alea.choice(mouvements)
+            i, j = tirage()
+            delta = variation(i, j)
+            if delta <= 0 or (T > 0 and alea.random() < math.exp(-delta / T)):
+                if delta > 0 and en_attente:
+                    meilleures, en_attente = etapes[:], False
+                applique(i, j)
+                longueur += delta
+                if longueur < meilleur:
+                    meilleur, en_attente = longueur, True
+            niter += 1
+
+        if en_attente:
+            meilleures = etapes[:]
+        print "Recuit #{}: L={} -> {} en {} iterations".format(
+            chaine, l0, meilleur, niter)
+
+        return Trajet(self, meilleures, longueur=meilleur)
+
+    def trajet_exact(self, nmax=20):
+        """
+        Retourne le trajet optimal (le plus court de tous les trajets),
+        déterminé par programmation dynamique (cf. `held_karp`) si le nombre
+        de destinations n'excède pas `nmax`, par séparation et évaluation
+        (cf. `separation_evaluation`) sinon.
+        """
+
+        if len(self.destinations) <= nmax:
+            return self.held_karp()
+        else:
+            return self.separation_evaluation()
+
+    def held_karp(self):
+        """
+        Retourne le trajet optimal, calculé par l'algorithme de
+        programmation dynamique de Held & Karp en O(n²·2ⁿ).
+
+        Pour chaque sous-ensemble *S* (masque binaire) des destinations
+        1…n-1 et chaque destination *j* de *S*, on calcule la longueur
+        minimale d'un chemin partant de la destination 0, parcourant *S* et
+        s'achevant en *j*.  Les sous-ensembles sont traités par couches de
+        cardinal croissant, seules les longueurs de la couche précédente
+        étant conservées; seul le prédécesseur optimal (entier 8 bits) de
+        chaque couple (*S*, *j*) est stocké pour reconstruire le trajet.
+        """
+
+        ndest = len(self.destinations)
+        if ndest <= 3:              # Tous les trajets sont équivalents
+            return Trajet(self)
+
+        m = ndest - 1               # Destinations hors départ
+        d = self.matrice_distances().astype(N.int64)
+        infini = N.iinfo(N.int64).max // 4
+
+        masques = N.arange(2**m, dtype=N.int64)
+        cardinal = N.zeros(2**m, dtype=N.int8)
+        for j in range(m):
+            cardinal += (masques >> j) & 1
+        couches = [ N.flatnonzero(cardinal == k) for k in range(m + 1) ]
+        del masques, cardinal
+        rang = N.empty(2**m, dtype=N.int32)  # Rang dans la couche
+        for couche in couches:
+            rang[couche] = N.arange(len(couche))
+        pred = N.empty((2**m, m), dtype=N.int8)  # Prédécesseurs
+
+        # Couche 1: chemins 0 -> j
+        couts = N.full((m, m), infini, dtype=N.int64)
+        couts[rang[1 << N.arange(m)], N.arange(m)] = d[0, 1:]
+        for k in range(2, m + 1):
+            couche = couches[k]
+            nouveaux = N.full((len(couche), m), infini, dtype=N.int64)
+            for j in range(m):
+                S = couche[(couche >> j) & 1 == 1]  # Sous-ensembles avec j
+                c = couts[rang[S ^ (1 << j)]] + d[1:, j + 1]
+                i = N.argmin(c, axis=1)
+                nouveaux[rang[S], j] = c[N.arange(len(S)), i]
+                pred[S, j] = i
+            couts = nouveaux
+
+        # Retour au point de départ, et reconstruction du trajet
+        j = N.argmin(couts[0] + d[1:, 0])
+        longueur = int(couts[0, j] + d[j + 1, 0])
+        S = 2**m - 1
+        etapes = []
+        while S:
+            etapes.append(j + 1)
+            S, j = S ^ (1 << j), pred[S, j]
+
+        return Trajet(self, [0] + etapes[::-1], longueur=longueur)
+
+    def separation_evaluation(self, trajet=None, narbres=2**16):
+        """
+        Retourne le trajet optimal, déterminé par une exploration en
+        profondeur des trajets partant de la destination 0, élaguée par
+        séparation et évaluation.
+
+        La longueur du meilleur trajet connu (initialement `trajet`, par
+        défaut le trajet des plus proches voisins optimisé par
+        `recherche_locale`) est comparée à deux bornes inférieures de la
+        longueur des trajets prolongeant le chemin courant:
+
+        - chaque arête restante relie deux extrémités, chaque destination
+          non visitée en est l'extrémité de deux (au moins aussi longues
+          que ses deux plus courtes arêtes), la destination courante et
+          celle de départ d'une;
+        - le chemin restant se compose d'une arête vers une destination non
+          visitée, et d'un arbre couvrant les destinations non visitées et
+          celle de départ (au moins aussi long que l'arbre couvrant
+          minimal).
+
+        Les poids des arbres couvrants minimaux sont mémorisés pour les
+        `narbres` ensembles de destinations les plus récemment utilisés
+        (il y a 2**(n-1) ensembles possibles).
+        """
+
+        ndest = len(self.destinations)
+        if ndest <= 3:
+            return Trajet(self)
+        if trajet is None:
+            trajet = self.recherche_locale(self.trajet_voisins())
+
+        matrice = self.matrice_distances()
+        d = matrice.tolist()
+        voisins = N.argsort(matrice, axis=1, kind='mergesort')[:, 1:].tolist()
+        aretes = N.sort(matrice, axis=1)[:, 1:3]
+        a1 = aretes[:, 0].tolist()                       # Plus courte arête
+        a12 = aretes.sum(axis=1).tolist()                # 2 plus courtes
+        arbres = OrderedDict()  # Poids des arbres couvrants, par masque
+
+        def arbre(masque):
+            """
+            Retourne le poids de l'arbre couvrant minimal (algorithme de
+            Prim) de la destination 0 et des destinations du `masque`.
+            """
+
+            if masque in arbres:        # Replacé en fin (le plus récent)
+                arbres[masque] = poids = arbres.pop(masque)
+                return poids
+            noeuds = [0] + [ j for j in range(ndest) if masque >> j & 1 ]
+            sous = matrice[N.ix_(noeuds, noeuds)].astype(N.int64)
+            couvert = N.zeros(len(noeuds), dtype=bool)
+            couvert[0] = True
+            dmin = sous[0].copy()
+            poids = 0
+            for k in range(len(noeuds) - 1):
+                k = N.argmin(N.where(couvert, N.iinfo(N.int64).max, dmin))
+                poids += dmin[k]
+                couvert[k] = True
+                dmin = N.minimum(dmin, sous[k])
+            arbres[masque] = poids = int(poids)
+            if len(arbres) > narbres:   # Le moins récemment utilisé
+                arbres.popitem(last=False)
+
+            return poids
+
+        meilleur = [trajet.longueur(), trajet.etapes.tolist()]
+        chemin = [0]
+        visite = [False] * ndest
+        visite[0] = True
+
+        def explore(courant, partiel, reste, masque):
+            """
+            Explore les prolongements du `chemin` de longueur `partiel`
+            s'achevant en `courant`, `reste` étant la somme des 2 plus
+            courtes arêtes des destinations non visitées (`masque`).
+            """
+
+            if not masque:
+                total = partiel + d[courant][0]
+                if total < meilleur[0]:
+                    meilleur[:] = [total, chemin[:]]
+                return
+            for j in voisins[courant]:
+                if visite[j]:
+                    continue
+                l = partiel + d[courant][j]
+                r = reste - a12[j]
+                m = masque ^ (1 << j)
+                # Bornes inférieures des trajets prolongeant chemin + [j]
+                if 2 * l + r + a1[j] + a1[0] >= 2 * meilleur[0]:
+                    continue
+                if m:
+                    proche = next(u for u in voisins[j] if m >> u & 1)
+                    if l + d[j][proche] + arbre(m) >= meilleur[0]:
+                        continue
+                visite[j] = True
+                chemin.append(j)
+                explore(j, l, r, m)
+                chemin.pop()
+                visite[j] = False
+
+        explore(0, 0, sum(a12) - a12[0], 2**ndest - 2)
+
+        return Trajet(self, meilleur[1], longueur=meilleur[0])
+
+    def axes(self, fig):
+        """
+        Retourne un nouvel axe de la figure `fig`, adapté à la
+        visualisation de la ville.
+        """
+
+        ndest = len(self.destinations)
+        taille = max(TAILLE, N.max(self.destinations) + 1 if ndest else 0)
+        ax = fig.add_subplot(1,1,1, aspect='equal',
+                             xlim=(0, taille), ylim=(0, taille),
+                             title="{} destinations".format(ndest))
+        if taille <= 2 * TAILLE:        # Graduation unitaire
             minor_loc = P.matplotlib.ticker.MultipleLocator(1)
             ax.xaxis.set_minor_locator(minor_loc)
             ax.yaxis.set_minor_locator(minor_loc)
-            ax.autoscale(False)
+        ax.autoscale(False)
+
+        return ax
 
+    def figure(self, trajet=None, ax=None, offset=0, etiquettes=None,
+               decimation=1, rasterise=None):
+        """
+        Visualisation d'une ville et d'un trajet.
+
+        Les destinations sont numérotées si `etiquettes` (par défaut, s'il
+        y en a au plus 100).  Le trajet est tracé d'un seul tenant
+        (`LineCollection`), en ne conservant qu'une étape sur `decimation`;
+        il est rastérisé (y compris dans les formats vectoriels) si
+        `rasterise` (par défaut, au-delà de 10⁴ étapes).
+        """
+
+        if ax is None:
+            ax = self.axes(P.figure(figsize=(6,6)))
+
+        ndest = len(self.destinations)
         if trajet is None:
+            if etiquettes is None:
+                etiquettes = (ndest <= 100)
             ax.plot(self.destinations[:, 0], self.destinations[:, 1],
-                    'ko', zorder=10)
-            for i,(x,y) in enumerate(self.destinations):
-                #ax.text(x, y, ' '+str(i))
-                ax.annotate(str(i), xy=(x, y), xytext=(x+0.5, y+0.5), zorder=10)
+                    'ko' if ndest <= 1000 else 'k,', zorder=10,
+                    rasterized=(ndest > 10**4))
+            if etiquettes:
+                for i,(x,y) in enumerate(self.destinations):
+                    #ax.text(x, y, ' '+str(i))
+                    ax.annotate(str(i), xy=(x, y), xytext=(x+0.5, y+0.5),
+                                zorder=10)
         else:
-            boucle = N.concatenate((trajet.etapes, [trajet.etapes[0]]))
-            ax.step(self.destinations[boucle, 0] + offset,
-                    self.destinations[boucle, 1] + offset,
-                    label="L={}".format(trajet.longueur()))
+            boucle = N.concatenate((trajet.etapes[::decimation],
+                                    trajet.etapes[:1]))
+            x = self.destinations[boucle, 0] + offset
+            y = self.destinations[boucle, 1] + offset
+            # Trajet en escalier (cf. `ax.step`): (x0, y0), (x0, y1), (x1, y1)…
+            sommets = N.empty((2 * len(boucle) - 1, 2))
+            sommets[0::2, 0], sommets[0::2, 1] = x, y
+            sommets[1::2, 0], sommets[1::2, 1] = x[:-1], y[1:]
+            couleurs = P.rcParams['axes.prop_cycle'].by_key()['color']
+            trace = P.matplotlib.collections.LineCollection(
+                [sommets], colors=couleurs[len(ax.collections) % len(couleurs)],
+                label="L={}".format(trajet.longueur()))
+            if rasterise is None:
+                rasterise = (len(boucle) > 10**4)
+            trace.set_rasterized(rasterise)
+            ax.add_collection(trace)
 
         return ax
 
+    def export(self, nomfichier, trajet=None, dpi=100, **options):
+        """
+        Sauvegarde de la visualisation de la ville et d'un trajet (cf.
+        `figure` pour les `options`) dans le fichier `nomfichier`, sans
+        affichage ni recours à `pyplot` (p.ex. en traitement par lots).
+        """
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(6,6))
+        FigureCanvasAgg(fig)            # Rendu hors-écran
+        ax = self.axes(fig)
+        self.figure(ax=ax, etiquettes=options.pop('etiquettes', None))
+        if trajet is not None:
+            self.figure(trajet, ax=ax, **options)
+            ax.legend(fontsize='small', loc='upper right')
+        fig.savefig(nomfichier, dpi=dpi)
+
+class Grille(object):
+
+    """
+    Grille, index spatial des destinations (non encore retirées) d'une
+    Ville, réparties dans des cellules carrées, pour la recherche rapide de
+    la plus proche destination au sens de la distance Manhattan-L1.
+    """
+
+    def __init__(self, destinations, densite=2):
+        """
+        Initialisation à partir du tableau (n, 2) des coordonnées
+        (entières) des `destinations`, avec en moyenne `densite`
+        destinations par cellule.
+        """
+
+        dest = N.asarray(destinations, dtype=int).reshape(-1, 2)
+        ndest = len(dest)
+        self.x, self.y = dest.T.tolist()
+        if ndest:
+            self.origine = dest.min(axis=0)
+            etendue = dest.max(axis=0) - self.origine + 1
+        else:
+            self.origine = N.zeros(2, dtype=int)
+            etendue = N.ones(2, dtype=int)
+
+        # Pas de la grille et nombre de cellules selon x et y
+        self.pas = int(math.ceil(
+            math.sqrt(densite * etendue.prod() / max(ndest, 1))))
+        self.nx, self.ny = ((etendue - 1) // self.pas + 1).tolist()
+
+        cx, cy = ((dest - self.origine) // self.pas).T
+        self.cellule = (cx * self.ny + cy).tolist()  # Cellule de chaque dest.
+        self.cellules = [ [] for c in range(self.nx * self.ny) ]
+        for j, c in enumerate(self.cellule):
+            self.cellules[c].append(j)
+        self.restantes = ndest
+
+    def __len__(self):
+        """Nombre de destinations restantes."""
+
+        return self.restantes
+
+    def retire(self, j):
+        """Retire la destination *j* de la grille."""
+
+        self.cellules[self.cellule[j]].remove(j)
+        self.restantes -= 1
+
+    def anneau(self, cx, cy, r):
+        """
+        Itère sur les cellules de la grille à distance (de Chebyshev) *r* de
+        la cellule (*cx*, *cy*).
+        """
+
+        if r == 0:
+            cellules = [(cx, cy)]
+        else:
+            cellules = ([ (i, j) for i in range(cx - r, cx + r + 1)
+                          for j in (cy - r, cy + r) ] +
+                        [ (i, j) for i in (cx - r, cx + r)
+                          for j in range(cy - r + 1, cy + r) ])
+        for i, j in cellules:
+            if 0 <= i < self.nx and 0 <= j < self.ny:
+                yield self.cellules[i * self.ny + j]
+
+    def plus_proche(self, x, y):
+        """
+        Retourne la destination restante la plus proche du point (*x*, *y*)
+        (celle de plus petit indice en cas d'égalité).
+
+        Les cellules sont parcourues par anneaux concentriques: les
+        destinations de l'anneau *r* + 1 étant au moins à la distance
+        *r*×`pas` + 1, la recherche s'arrête dès qu'une destination plus
+        proche a été trouvée.
+        """
+
+        if not self.restantes:
+            raise ValueError("Aucune destination disponible")
+
+        cx = (x - self.origine[0]) // self.pas
+        cy = (y - self.origine[1]) // self.pas
+        rmax = max(cx, self.nx - 1 - cx, cy, self.ny - 1 - cy)
+        meilleur = None                 # (distance, indice)
+        for r in range(rmax + 1):
+            for cellule in self.anneau(cx, cy, r):
+                for j in cellule:
+                    d = (abs(self.x[j] - x) + abs(self.y[j] - y), j)
+                    if meilleur is None or d < meilleur:
+                        meilleur = d
+            if meilleur is not None and meilleur[0] <= r * self.pas:
+                break
+
+        return meilleur[1]
+
 
 class Trajet(object):
 
     """
     Trajet, contient une liste ordonnée des destinations (étapes) d'une
     Ville.
+
+    Les étapes sont stockées dans un tableau d'entiers 32 bits, et la
+    longueur du trajet est conservée une fois calculée, puis mise à jour
+    de façon incrémentale par les mouvements (`interversion`, `inversion`).
+    Toute modification *en place* des étapes doit donc être suivie d'une
+    réaffectation (`trajet.etapes = ...`) pour invalider la longueur.
     """
 
-    def __init__(self, ville, etapes=None):
+    def __init__(self, ville, etapes=None, longueur=None):
         """
         Initialisation sur une `ville`.  Si `etapes` n'est pas spécifié, le
         trajet par défaut est celui suivant les destinations de `ville`.
+        La `longueur` du trajet, si elle est déjà connue, peut être
+        spécifiée.
         """
 
         assert isinstance(ville, Ville)
@@ -200,7 +1223,21 @@ class Trajet(object):
         if etapes is None:                     # Trajet par défaut
             self.etapes = N.arange(len(self.ville.destinations))
         else:
-            self.etapes = N.array(etapes)
+            self.etapes = etapes
+        self._longueur = longueur
+
+    @property
+    def etapes(self):
+        """Tableau ordonné des étapes du trajet."""
+
+        return self._etapes
+
+    @etapes.setter
+    def etapes(self, etapes):
+        """Mise à jour des étapes, et invalidation de la longueur."""
+
+        self._etapes = N.array(etapes, dtype=N.int32)
+        self._longueur = None
 
     def __str__(self):
 
@@ -213,11 +1250,45 @@ class Trajet(object):
         point de départ).
         """
 
-        l = sum( self.ville.distance(self.etapes[i], self.etapes[i+1])
-                 for i in range(len(self.etapes)-1) )
-        l += self.ville.distance(self.etapes[-1], self.etapes[0])
+        if self._longueur is None:
+            # Étapes successives, y compris le retour au point de départ
+            self._longueur = int(self.ville.distances_paires(
+                self.etapes, N.roll(self.etapes, -1)).sum())
+
+        return self._longueur
+
+    def longueur_aretes(self, aretes, etapes=None):
+        """
+        Retourne la longueur cumulée des arêtes (bouclées) débutant aux
+        positions `aretes` du tableau d'`etapes` (par défaut celles du
+        trajet).
+        """
+
+        if etapes is None:
+            etapes = self.etapes
+        aretes = N.asarray(aretes)
 
-        return l
+        return int(self.ville.distances_paires(
+            etapes[aretes % len(etapes)],
+            etapes[(aretes + 1) % len(etapes)]).sum())
+
+    def deplacement(self, etapes, aretes):
+        """
+        Retourne un nouveau `Trajet` sur les `etapes` spécifiées, ne
+        différant du trajet courant que par les arêtes débutant aux
+        positions `aretes`.  Si la longueur du trajet courant est connue,
+        celle du nouveau trajet est mise à jour à partir de ces seules
+        arêtes.
+        """
+
+        if self._longueur is None:
+            return Trajet(self.ville, etapes)
+
+        aretes = N.unique(N.asarray(aretes) % len(etapes))
+        longueur = (self._longueur - self.longueur_aretes(aretes) +
+                    self.longueur_aretes(aretes, etapes))
+
+        return Trajet(self.ville, etapes, longueur=longueur)
 
     def interversion(self, i, j):
         """
@@ -228,7 +1299,19 @@ class Trajet(object):
         etapes = self.etapes.copy()
         etapes[[i, j]] = etapes[[j, i]]
 
-        return Trajet(self.ville, etapes)
+        return self.deplacement(etapes, [i - 1, i, j - 1, j])
+
+    def inversion(self, i, j):
+        """
+        Retourne un nouveau `Trajet` résultant de l'inversion de la portion
+        du trajet comprise entre les étapes *i* et *j* (incluses).
+        """
+
+        i, j = sorted((i, j))
+        etapes = self.etapes.copy()
+        etapes[i:j+1] = etapes[i:j+1][::-1]
+
+        return self.deplacement(etapes, [i - 1, j])
 
 
 def fig_velocimetrie(nomfichier="velocimetrie.dat"):
@@ -295,6 +1378,32 @@ def test_ville_ecriture(ville_test):
     ville.lecture("test_ecriture.dat")
     assert (ville_test.destinations == ville.destinations).all()
 
+def test_ville_ecriture_binaire(ville_test):
+
+    ville_test.ecriture("test_ecriture.bin", binaire=True)
+    ville = Ville()
+    ville.lecture("test_ecriture.bin")
+    assert isinstance(ville.destinations, N.memmap)
+    assert (ville_test.destinations == ville.destinations).all()
+
+def test_lecture_ascii():
+
+    destinations = lecture_ascii("ville.dat", bloc=10)    # Blocs de 10 oct.
+    assert (destinations == N.loadtxt("ville.dat", dtype=int)).all()
+
+def test_lecture_ascii_invalide(tmpdir):
+
+    fichier = tmpdir.join("ville.dat")
+    fichier.write("# commentaire\n1 2\n\n3 4\n")       # Lignes vides
+    assert (lecture_ascii(str(fichier)) == [[1, 2], [3, 4]]).all()
+    for texte in ["1 2 3\n4 5 6", "1\n2\n3\n4\n", "1 2\n3 x\n", "1 2\n3\n"]:
+        fichier.write(texte)
+        for bloc in (4, 2**24):
+            with pytest.raises(ValueError):
+                lecture_ascii(str(fichier), bloc=bloc)
+        with pytest.raises(IOError):
+            Ville().lecture(str(fichier))
+
 def test_ville_trajets(ville_test):
 
     assert ville_test.nb_trajets() == 3
@@ -305,6 +1414,16 @@ def test_ville_distance(ville_test):
     assert ville_test.distance(1, 2) == 3
     assert ville_test.distance(2, 0) == 3
 
+def test_ville_matrice_distances(ville_test):
+
+    distances = ville_test.matrice_distances()
+    assert distances.dtype == N.int32
+    assert (distances == distances.T).all()
+    assert (distances[0] == [0, 2, 3, 4]).all()
+    assert ville_test.matrice_distances() is distances     # Cache
+    ville_test.aleatoire(6)                                # Invalidation
+    assert ville_test.matrice_distances().shape == (6, 6)
+
 def test_trajet_init(ville_test):
 
     trajet = Trajet(ville_test)
@@ -324,18 +1443,128 @@ def test_ville_plus_proche(ville_test):
     assert ville_test.plus_proche(0) == 1
     assert ville_test.plus_proche(0, [1, 2]) == 3
 
+def test_ville_plus_proche_masque(ville_test):
+
+    assert ville_test.plus_proche(0, N.array([0, 1, 1, 0], dtype=bool)) == 3
+
+def test_grille(ville_test):
+
+    grille = Grille(ville_test.destinations)
+    assert len(grille) == 4
+    assert grille.plus_proche(0, 0) == 0
+    grille.retire(0)
+    assert grille.plus_proche(0, 0) == 1
+    grille.retire(1)
+    assert len(grille) == 2
+    assert grille.plus_proche(0, 0) == 2   # Égalité avec 3: plus petit indice
+
 def test_ville_trajet_voisins(ville_test):
 
     assert (ville_test.trajet_voisins(depart=0).etapes == [0, 1, 3, 2]).all()
 
+def test_ville_meilleur_depart():
+
+    ville = Ville()
+    ville.aleatoire(30)
+    trajet = ville.trajet_voisins(depart=None)
+    assert (ville.trajet_voisins(depart=None, nproc=3).etapes ==
+            trajet.etapes).all()
+    trajet = ville.trajet_opt2(departs=range(6))
+    assert (ville.trajet_opt2(departs=range(6), nproc=2).etapes ==
+            trajet.etapes).all()
+
+def test_ville_recuit():
+
+    ville = Ville()
+    ville.aleatoire(30)
+    trajet = ville.trajet_voisins()
+    opt = ville.recuit(trajet, duree=None, maxiter=20000, graine=1)
+    assert (N.sort(opt.etapes) == N.arange(30)).all()
+    assert opt.longueur() == Trajet(ville, opt.etapes).longueur()
+    assert opt.longueur() <= trajet.longueur()
+    # Chaînes indépendantes: résultat indépendant du nombre de processus
+    opt = ville.recuit(trajet, nchaines=2, duree=None, maxiter=5000, graine=1)
+    assert (ville.recuit(trajet, nchaines=2, nproc=2, duree=None,
+                         maxiter=5000, graine=1).etapes == opt.etapes).all()
+
+def test_ville_trajet_exact():
+
+    import itertools
+
+    ville = Ville()
+    ville.aleatoire(8)
+    longueur = min( Trajet(ville, (0,) + etapes).longueur()
+                    for etapes in itertools.permutations(range(1, 8)) )
+    for trajet in (ville.held_karp(), ville.separation_evaluation(),
+                   ville.separation_evaluation(narbres=4)):
+        assert (N.sort(trajet.etapes) == N.arange(8)).all()
+        assert trajet.longueur() == longueur
+        assert Trajet(ville, trajet.etapes).longueur() == longueur
+    ville.aleatoire(12)
+    assert (ville.trajet_exact().longueur() ==
+            ville.trajet_exact(nmax=0).longueur())
+
 def test_trajet_interversion(trajet_test):
 
     assert (trajet_test.interversion(0, 1).etapes == [1, 0, 2, 3]).all()
 
+def test_trajet_longueur_incrementale():
+
+    ville = Ville()
+    ville.aleatoire(15)
+    trajet = Trajet(ville, N.random.permutation(15))
+    assert trajet.etapes.dtype == N.int32
+    trajet.longueur()
+    for i, j in [(0, 1), (0, 14), (3, 9), (5, 5)]:
+        for t in (trajet.interversion(i, j), trajet.inversion(i, j)):
+            assert t.longueur() == Trajet(ville, t.etapes).longueur()
+    trajet.etapes = N.arange(15)                   # Invalidation
+    assert trajet.longueur() == Trajet(ville).longueur()
+
 def test_ville_optimisation_trajet(ville_test, trajet_test):
 
     assert (ville_test.optimisation_trajet(trajet_test).etapes ==
             [1, 0, 2, 3]).all()
+    assert (ville_test.optimisation_trajet(trajet_test,
+                                           variations=False).etapes ==
+            [1, 0, 2, 3]).all()
+
+def test_ville_variations_interversion():
+
+    ville = Ville()
+    ville.aleatoire(12)
+    trajet = Trajet(ville, N.random.permutation(12))
+    for i, j, delta in zip(*ville.variations_interversion(trajet)):
+        assert (trajet.interversion(i, j).longueur() ==
+                trajet.longueur() + delta)
+
+def test_ville_voisins_proches(ville_test):
+
+    voisins = ville_test.voisins_proches(2)
+    assert voisins.shape == (4, 2)
+    assert (voisins[0] == [1, 2]).all()
+    assert (voisins[3] == [1, 2]).all()
+
+def test_ville_recherche_locale():
+
+    ville = Ville()
+    ville.aleatoire(200)
+    trajet = Trajet(ville, N.random.permutation(200))
+    opt = ville.recherche_locale(trajet, k=6)
+    assert (N.sort(opt.etapes) == N.arange(200)).all()
+    assert opt.longueur() < trajet.longueur()
+    # Un trajet localement optimal n'est plus amélioré
+    assert ville.recherche_locale(opt, k=6).longueur() == opt.longueur()
+
+def test_ville_export():
+
+    import os
+
+    ville = Ville()
+    ville.aleatoire(2000)
+    ville.export("test_export.png", ville.trajet_voisins(), decimation=2)
+    assert os.path.getsize("test_export.png") > 0
+    os.remove("test_export.png")
 
 # def test_ville_ppv():
 
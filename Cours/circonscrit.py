@@ -10,7 +10,7 @@ Ce script sert d'illustration à plusieurs concepts indépendants:
   utilisation en module (`import circonscrit`) et en exécutable
   (`python circonscrit.py -h`);
 - des exemples de Programmation Orientée Objet: classe `Point` et la
-  classe héritière `Vector`;
+  classe héritière `Vector` (avec `__slots__` et opérateurs en place);
 - un exemple d'utilisation du module `argparse` de la bibliothèque
   standard, permettant la gestion des arguments de la ligne de
   commande;
@@ -35,8 +35,14 @@ class Point:
     """
     Classe définissant un `Point` du plan, caractérisé par ses
     coordonnées `x`,`y`.
+
+    La déclaration `__slots__` fixe la liste des attributs des instances,
+    qui n'ont alors pas de dictionnaire `__dict__`: elles sont plus
+    compactes et plus rapides d'accès.
     """
 
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         """
         Méthode d'instanciation à partir de deux coordonnées réelles.
@@ -117,6 +123,8 @@ class Vector(Point):
     la rotation d'un vecteur).
     """
 
+    __slots__ = ('sqnorm',)  # Attribut(s) ajouté(s) à ceux de Point
+
     def __init__(self, A, B):
         """
         Définit le vecteur `AB` à partir des deux points `A` et `B`.
@@ -181,6 +189,48 @@ class Vector(Point):
 
         return Vector(O, Point(self.x - other.x, self.y - other.y))
 
+    def __iadd__(self, other):
+        """
+        Surcharge de l'opérateur d'affectation augmentée `{self} +=
+        {other}`: contrairement à `__add__`, on modifie l'objet `self`
+        lui-même (qui est retourné), sans construire de nouvelle instance.
+
+        >>> A = Point(1, 0); B = Point(1, 1)
+        >>> u = Vector(A, B); v = u
+        >>> u += Vector(B, O)
+        >>> u is v, str(u), u.sqnorm
+        (True, 'Vector (x=-1.0, y=0.0)', 1.0)
+        """
+
+        return self.axpy(1, other)
+
+    def __isub__(self, other):
+        """
+        Surcharge de l'opérateur d'affectation augmentée `{self} -=
+        {other}` (modification en place).
+
+        >>> u = Vector(O, Point(1, 1)); u -= u; str(u)
+        'Vector (x=0.0, y=0.0)'
+        """
+
+        return self.axpy(-1, other)
+
+    def axpy(self, a, other):
+        """
+        Ajoute en place `a * other` à `self` (et retourne `self`), sans
+        vecteur intermédiaire. L'attribut `sqnorm` est mis à jour.
+
+        >>> u = Vector(O, Point(1, 1)); str(u.axpy(2, u)), u.sqnorm
+        ('Vector (x=3.0, y=3.0)', 18.0)
+        """
+
+        x, y = a * other.x, a * other.y  # Lève une exception avant modif.
+        self.x += x
+        self.y += y
+        self.sqnorm = self.x ** 2 + self.y ** 2
+
+        return self
+
     def __eq__(self, other):
         """
         Surcharge du test d'égalité `{self}=={other}`: l'instruction sera
@@ -7,6 +7,8 @@ Jeu de la vie (programmation orientée objet).
 
 import random
 
+import numpy as N
+
 
 class Life:
 
@@ -14,18 +16,20 @@ class Life:
 
     def __init__(self, h, w, periodic=False):
         """
-        Create a 2D-list (the game grid *G*) with the wanted size (*h*
-        rows, *w* columns) and initialize it with random booleans
+        Create a 2D uint8 array (the game grid *G*) with the wanted size
+        (*h* rows, *w* columns) and initialize it with random booleans
         (dead/alive). The world is periodic if *periodic* is True.
         """
 
         self.h = int(h)
         self.w = int(w)
         assert self.h > 0 and self.w > 0
-        # Random initialization of a h×w world
-        self.world = [[random.choice([True, False])
-                       for j in range(self.w)]
-                      for i in range(self.h)]  # h rows of w elements
+        # Random initialization of a h×w world, one random bit per cell
+        # (drawn from the random module, so that random.seed still applies)
+        bits = random.getrandbits(8 * ((self.h * self.w + 7) // 8))
+        self.world = N.unpackbits(N.frombuffer(
+            bits.to_bytes((self.h * self.w + 7) // 8, 'little'),
+            dtype=N.uint8))[:self.h * self.w].reshape(self.h, self.w)
         self.periodic = periodic
 
     def get(self, i, j):
@@ -35,10 +39,10 @@ class Life:
         """
 
         if self.periodic:
-            return self.world[i % self.h][j % self.w]  # Periodic conditions
+            return bool(self.world[i % self.h, j % self.w])  # Periodic
         else:
             if (0 <= i < self.h) and (0 <= j < self.w):  # Inside grid
-                return self.world[i][j]
+                return bool(self.world[i, j])
             else:                       # Outside grid
                 return False            # There's nobody out there...
 
@@ -47,13 +51,14 @@ class Life:
         Convert the grid to a visually handy string.
         """
 
-        return '\n'.join([''.join([self.cells[val] for val in row])
-                          for row in self.world])
+        symbols = N.array([self.cells[False], self.cells[True]])
+        return '\n'.join([''.join(row) for row in symbols[self.world]])
 
     def evolve_cell(self, i, j):
         """
         Tells if cell (*i*,*j*) will survive during game iteration,
-        depending on the number of living neighboring cells.
+        depending on the number of living neighboring cells (cell by
+        cell reference of `evolve`).
         """
 
         alive = self.get(i, j)           # Current cell status
@@ -75,15 +80,213 @@ class Life:
 
         return future
 
+    def neighbors(self):
+        """
+        Return the array of the numbers of living neighbors of each cell,
+        as the sum of the 8 shifted copies of the world padded by one cell
+        (with the opposite edges if periodic, dead cells otherwise).
+        """
+
+        padded = N.pad(self.world, 1, mode='wrap' if self.periodic
+                       else 'constant')
+        count = N.zeros_like(self.world)
+        for ii in [0, 1, 2]:
+            for jj in [0, 1, 2]:
+                if (ii, jj) != (1, 1):
+                    count += padded[ii:ii + self.h, jj:jj + self.w]
+
+        return count
+
     def evolve(self):
         """
         Evolve the game grid by one step.
         """
 
-        # Update the grid
-        self.world = [[self.evolve_cell(i, j)
-                       for j in range(self.w)]
-                      for i in range(self.h)]
+        count = self.neighbors()
+        # A cell w/ 3 neighbors lives, a cell w/ 2 neighbors stays as it is
+        alive = (count == 3) | ((count == 2) & (self.world == 1))
+        self.world = alive.view(N.uint8)
+
+
+class PackedLife(Life):
+
+    """
+    A Life whose world is packed 64 cells per machine word: cell (*i*,*j*)
+    is bit *j* % 64 of word *j* // 64 of row *i* of the (h, ceil(w/64))
+    uint64 array `packed`, i.e. one bit per cell.  Whole rows evolve at
+    once with bitwise adder logic, by strips of about `block` words to
+    bound the temporaries.  The `world` property (un)packs a uint8 grid,
+    for display and conversions.
+    """
+
+    block = 2 ** 14                     # Words per strip of rows
+
+    def __init__(self, h, w, periodic=False):
+        """
+        Create the packed game grid with the wanted size (*h* rows, *w*
+        columns) and initialize it with random booleans (dead/alive),
+        row by row. The world is periodic if *periodic* is True.
+        """
+
+        self.h = int(h)
+        self.w = int(w)
+        assert self.h > 0 and self.w > 0
+        self.nwords = (self.w + 63) // 64
+        self.packed = N.empty((self.h, self.nwords), dtype='<u8')
+        for row in self.packed:         # One random bit per cell
+            row[:] = N.frombuffer(random.getrandbits(self.w).to_bytes(
+                8 * self.nwords, 'little'), dtype='<u8')
+        # Valid bits of each word (the last one may be incomplete)
+        self.mask = N.full(self.nwords, ~N.uint64(0), dtype='<u8')
+        if self.w % 64:
+            self.mask[-1] = (1 << (self.w % 64)) - 1
+        self.periodic = periodic
+
+    @property
+    def world(self):
+        """
+        The game grid as a 2D uint8 array (unpacked copy).
+        """
+
+        return N.unpackbits(self.packed.view(N.uint8), axis=1,
+                            bitorder='little')[:, :self.w]
+
+    @world.setter
+    def world(self, world):
+        world = N.asarray(world, dtype=N.uint8).reshape(self.h, self.w)
+        packed = N.zeros((self.h, 8 * self.nwords), dtype=N.uint8)
+        bits = N.packbits(world, axis=1, bitorder='little')
+        packed[:, :bits.shape[1]] = bits
+        self.packed = packed.view('<u8')
+
+    def get(self, i, j):
+        """
+        This method returns the state of cell (*i*,*j*) safely, even
+        if the (*i*,*j*) is outside the grid.
+        """
+
+        if self.periodic:
+            i, j = i % self.h, j % self.w  # Periodic conditions
+        elif not ((0 <= i < self.h) and (0 <= j < self.w)):  # Outside grid
+            return False
+        return bool((int(self.packed[i, j // 64]) >> (j % 64)) & 1)
+
+    def shifted(self, rows):
+        """
+        Return the packed *rows* shifted so that each bit holds the state
+        of its west (*j* - 1) and east (*j* + 1) neighbors respectively.
+        """
+
+        west = rows << 1
+        west[:, 1:] |= rows[:, :-1] >> 63
+        east = rows >> 1                # Padding bits of the last word are 0
+        east[:, :-1] |= rows[:, 1:] << 63
+        if self.periodic:               # Wrap around between w-1 and 0
+            last = N.uint64((self.w - 1) % 64)
+            west[:, 0] |= (rows[:, -1] >> last) & N.uint64(1)
+            east[:, -1] |= (rows[:, 0] & N.uint64(1)) << last
+
+        return west, east
+
+    def generation(self, rows):
+        """
+        Return the next generation of the packed *rows*[1:-1], given their
+        neighboring rows *rows*[0] and *rows*[-1].
+        """
+
+        # Operations are done in place as much as possible: the strip is
+        # small enough for the cache, and each temporary costs a full pass
+        west, east = self.shifted(rows)
+        # Horizontal sums west + center + east (0-3) on 2 bits: full adder
+        s0 = west ^ rows
+        s1 = west & rows
+        s1 |= N.bitwise_and(east, s0, out=west)
+        s0 ^= east
+        # Sum of the 9 cells (0-9) on 4 bits u3 u2 u1 u0, by adding the
+        # horizontal sums of the rows above (a), at (b) and below (c)
+        a0, b0, c0 = s0[:-2], s0[1:-1], s0[2:]
+        a1, b1, c1 = s1[:-2], s1[1:-1], s1[2:]
+        u0 = a0 ^ b0                    # Weight 1: a0 + b0 + c0
+        k = a0 & b0
+        k |= c0 & u0                    # Carry (weight 2)
+        u0 ^= c0
+        u1 = a1 ^ b1                    # Weight 2: a1 + b1 + c1 + k
+        u2 = a1 & b1
+        u2 |= c1 & u1                   # Carry (weight 4)
+        u1 ^= c1
+        carry = u1 & k                  # Second carry (weight 4)
+        u1 ^= k
+        u3 = u2 & carry                 # Weight 8
+        u2 ^= carry                     # Weight 4
+        # Alive if the sum is 3 (u0 u1 ~u2), or 4 (~u0 ~u1 u2) w/ a living
+        # center, i.e. u0 == u1 != u2, u0 or center, and not 8 or 9 (u3)
+        u3 |= u0 ^ u1
+        N.invert(u3, out=u3)
+        u2 ^= u0
+        u0 |= rows[1:-1]
+        u2 &= u0
+        u2 &= u3
+        u2 &= self.mask
+
+        return u2
+
+    def evolve(self):
+        """
+        Evolve the game grid by one step, strip of rows by strip of rows
+        (in place, saving the rows still needed as neighbors).
+        """
+
+        x = self.packed
+        zero = N.zeros(self.nwords, dtype=x.dtype)
+        first, above = (x[0].copy(), x[-1].copy()) if self.periodic \
+            else (zero, zero)
+        nrows = max(self.block // self.nwords, 1)
+        for a in range(0, self.h, nrows):
+            b = min(a + nrows, self.h)
+            below = x[b] if b < self.h else first
+            rows = N.vstack((above, x[a:b], below))
+            above = x[b - 1].copy()     # Old state of the next strip's top
+            x[a:b] = self.generation(rows)
+
+
+def test_Life():
+    random.seed(1)
+    for h, w in [(1, 1), (2, 5), (7, 3), (12, 17)]:
+        for periodic in [False, True]:
+            life = Life(h, w, periodic=periodic)
+            assert life.world.dtype == N.uint8 and life.world.shape == (h, w)
+            for generation in range(3):
+                expected = [[life.evolve_cell(i, j) for j in range(w)]
+                            for i in range(h)]
+                life.evolve()
+                assert life.world.tolist() == expected
+    life.world[:] = 0
+    life.world[3, 4:7] = 1              # Blinker
+    assert str(life).splitlines()[3] == "....###" + "." * 10
+    assert life.get(3, 4) and life.get(3, 4 - 17) == life.periodic
+    life.evolve()
+    assert life.world[2:5, 5].all() and life.world.sum() == 3
+
+def test_PackedLife():
+    random.seed(2)
+    for h, w in [(1, 1), (2, 2), (5, 63), (4, 64), (9, 65), (70, 130)]:
+        for periodic in [False, True]:
+            life = Life(h, w, periodic=periodic)
+            packed = PackedLife(h, w, periodic=periodic)
+            assert packed.packed.nbytes == 8 * h * ((w + 63) // 64)
+            packed.world = life.world
+            packed.block = 3            # Several strips of rows
+            for generation in range(4):
+                life.evolve()
+                packed.evolve()
+                assert (packed.world == life.world).all()
+            assert str(packed) == str(life)
+            assert [packed.get(i, j) for i in (-1, 0, h) for j in (-1, w)] \
+                == [life.get(i, j) for i in (-1, 0, h) for j in (-1, w)]
+    packed = PackedLife(100, 1000)
+    assert 0.45 < packed.world.mean() < 0.55
+    assert not (packed.packed & ~packed.mask).any()  # Padding bits dead
+
 
 if __name__ == "__main__":
 
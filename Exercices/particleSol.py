@@ -3,7 +3,15 @@
 
 
 import pytest                    # pytest importé pour les tests unitaires
+import itertools
+import json
 import math
+import os
+import queue
+import struct
+import threading
+
+import numpy as N
 
 """
 Définition d'une classe point matériel, avec sa masse, sa position et sa
@@ -28,9 +36,13 @@ class Vector:
     """
     Une classe-structure simple contenant 3 coordonnées.
     Une méthode est disponible pour en calculer la norme et
-    une surcharge des opérateurs ==, !=, +, - et * est proposée.
+    une surcharge des opérateurs ==, !=, +, - et * est proposée, ainsi que
+    des versions en place (+=, -=, *= et axpy), qui ne créent pas de
+    nouveau Vector.
     """
 
+    __slots__ = ('x', 'y', 'z')     # Pas de __dict__ par instance
+
     def __init__(self, x=0, y=0, z=0):
         """
         Constructeur de la classe vector.
@@ -137,6 +149,80 @@ class Vector:
 
     __rmul__ = __mul__  # Ligne pour autoriser la multiplication à droite
 
+    def __iadd__(self, other):
+        """
+        Surcharge de l'opérateur `+=` (addition en place).
+
+        Args :
+                other(Vector): Un autre vecteur
+
+        Raises :
+                TypeError si other n'est pas un objet Vector
+        """
+        return self.axpy(1, other)
+
+    def __isub__(self, other):
+        """
+        Surcharge de l'opérateur `-=` (soustraction en place).
+
+        Args :
+                other(Vector): Un autre vecteur
+
+        Raises :
+                TypeError si other n'est pas un objet Vector
+        """
+        try:
+            x, y, z = other.x, other.y, other.z
+        except AttributeError:
+            raise TypeError("Tried to substract Vector and non-Vector objects")
+        self.x -= x
+        self.y -= y
+        self.z -= z
+        return self
+
+    def __imul__(self, number):
+        """
+        Surcharge de l'opérateur `*=` (multiplication en place par un
+        nombre).
+
+        Args :
+                number(float): Un nombre à multiplier par le Vector.
+
+        Raises :
+                TypeError si number n'est pas un nombre
+        """
+        try:
+            number = float(number)
+        except (ValueError, TypeError, AttributeError):
+            raise TypeError("Tried to multiply Vector and non-number objects")
+        self.x *= number
+        self.y *= number
+        self.z *= number
+        return self
+
+    def axpy(self, a, other):
+        """
+        Ajoute en place a * other à self, sans vecteur intermédiaire.
+
+        Args :
+                a(float): Un nombre
+                other(Vector): Un autre vecteur
+
+        Returns :
+                self
+
+        Raises :
+                TypeError si a n'est pas un nombre ou other un objet Vector
+        """
+        try:
+            x, y, z = a * other.x, a * other.y, a * other.z
+        except (ValueError, TypeError, AttributeError):
+            raise TypeError("Tried to add Vector and non-Vector objects")
+        self.x += x
+        self.y += y
+        self.z += z
+        return self
+
     def norm(self):
         """
         Calcul de la norme 2 d'un vecteur.
@@ -218,6 +304,212 @@ def test_VectorClone():
     assert vec != vec2
 
 
+####################################################################
+##### Des attributs pouvant être stockés dans un System (vues) #####
+####################################################################
+
+class VectorView(Vector):
+    """
+    Un Vector dont les composantes sont lues et écrites directement dans
+    la ligne index du tableau (N, 3) name d'un System.
+    """
+
+    __slots__ = ('system', 'name', 'index')
+
+    def __init__(self, system, name, index):
+        self.system, self.name, self.index = system, name, index
+
+    def _component(i):
+        def get(self):
+            return float(getattr(self.system, self.name)[self.index, i])
+
+        def set(self, value):
+            getattr(self.system, self.name)[self.index, i] = value
+
+        return property(get, set)
+
+    x, y, z = _component(0), _component(1), _component(2)
+
+
+class SystemAttribute:
+    """
+    Descripteur d'un attribut de particule (masse, charge, position,...)
+    stocké dans l'objet lui-même, ou dans le tableau de même nom de son
+    System une fois la particule ajoutée à celui-ci.
+    """
+
+    def __init__(self, name, kind=float):
+        self.name, self.kind = name, kind
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        if obj.system is None:
+            try:
+                return obj.__dict__[self.name]
+            except KeyError:
+                raise AttributeError(self.name)
+        if getattr(obj.system, self.name).ndim == 2:
+            return VectorView(obj.system, self.name, obj.index)
+        return self.kind(getattr(obj.system, self.name)[obj.index])
+
+    def __set__(self, obj, value):
+        if obj.system is None:
+            obj.__dict__[self.name] = value
+        elif getattr(obj.system, self.name).ndim == 2:
+            getattr(obj.system, self.name)[obj.index] = \
+                value.x, value.y, value.z
+        else:
+            getattr(obj.system, self.name)[obj.index] = value
+
+
+########################################################
+##### Une suite de Vector stockée en tableau NumPy #####
+########################################################
+
+class VectorArray:
+    """
+    Un VectorArray est la version vectorielle d'une suite de Vector: ses
+    coordonnées sont stockées dans un tableau NumPy (N, 3), sur lequel
+    portent les mêmes opérations que pour Vector (+, -, *, leurs versions
+    en place et axpy, norm).  Ses éléments sont des vues VectorView sur
+    les lignes du tableau.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data=()):
+        """
+        Le constructeur de la classe VectorArray.
+
+        Args :
+                data: Tableau (N, 3), partagé sans copie s'il s'agit déjà
+                        d'un tableau de réels, ou suite de Vector
+
+        Raises :
+                TypeError si data n'est ni un tableau (N, 3) ni une suite
+                        de Vector
+        """
+        if not isinstance(data, N.ndarray):
+            data = [(v.x, v.y, v.z) if isinstance(v, Vector) else v
+                    for v in data]
+        try:
+            self.data = N.asarray(data, dtype=float).reshape(-1, 3)
+        except (ValueError, TypeError):
+            raise TypeError("The data must be an (N, 3) array or Vectors")
+
+    @staticmethod
+    def _array(other):
+        # Tableau (N, 3) ou (3,) (diffusé) des coordonnées de other
+        if isinstance(other, VectorArray):
+            return other.data
+        try:
+            return N.array((other.x, other.y, other.z))
+        except AttributeError:
+            raise TypeError("Tried to combine VectorArray and non-Vector "
+                            "objects")
+
+    @staticmethod
+    def _factor(number):
+        # Nombre, ou tableau (N,) de nombres diffusé sur les coordonnées
+        try:
+            number = N.asarray(number, dtype=float)
+        except (ValueError, TypeError):
+            raise TypeError("Tried to multiply VectorArray and non-number "
+                            "objects")
+        return number[:, None] if number.ndim else number
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return VectorArray(self.data[i])
+        return VectorView(self, 'data', range(len(self))[i])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __add__(self, other):
+        return VectorArray(self.data + self._array(other))
+
+    def __sub__(self, other):
+        return VectorArray(self.data - self._array(other))
+
+    def __mul__(self, number):
+        return VectorArray(self._factor(number) * self.data)
+
+    __rmul__ = __mul__
+
+    def __iadd__(self, other):
+        self.data += self._array(other)
+        return self
+
+    def __isub__(self, other):
+        self.data -= self._array(other)
+        return self
+
+    def __imul__(self, number):
+        self.data *= self._factor(number)
+        return self
+
+    def axpy(self, a, other):
+        """
+        Ajoute en place a * other à self (a: nombre ou tableau (N,)).
+
+        Returns :
+                self
+        """
+        self.data += self._factor(a) * self._array(other)
+        return self
+
+    def norm(self):
+        """
+        Renvoie le tableau (N,) des normes 2 des vecteurs.
+        """
+        return N.sqrt(N.einsum('ij,ij->i', self.data, self.data))
+
+
+def test_VectorInPlace():
+    vec = Vector(1, -7, 9)
+    same = vec
+    vec += Vector(1, 1, 1)
+    vec -= Vector(0, 0, 10)
+    vec *= 2
+    assert vec is same and vec == Vector(4, -12, 0)
+    assert vec.axpy(0.5, Vector(2, 2, 2)) is same
+    assert vec == Vector(5, -11, 1)
+    with pytest.raises(TypeError):
+        vec += 1
+    with pytest.raises(TypeError):
+        vec *= 'two'
+    assert vec == Vector(5, -11, 1)     # inchangé après une erreur
+    with pytest.raises(AttributeError):
+        vec.w = 0                       # __slots__: pas d'autre attribut
+
+
+def test_VectorArray():
+    vectors = VectorArray([Vector(1, 0, 0), Vector(0, 3, 4)])
+    assert len(vectors) == 2 and vectors[-1] == Vector(0, 3, 4)
+    assert (vectors.norm() == [1, 5]).all()
+    total = vectors + Vector(1, 1, 1)
+    assert [v == w for v, w in zip(total, (Vector(2, 1, 1),
+                                           Vector(1, 4, 5)))] == [True] * 2
+    data = N.zeros((2, 3))
+    shared = VectorArray(data)          # vue sans copie
+    shared.axpy([1, 2], vectors)
+    shared -= vectors
+    shared *= 2
+    assert (data == [[0, 0, 0], [0, 6, 8]]).all()
+    shared[0].x = 7
+    assert data[0, 0] == 7
+    assert (2 * vectors - vectors).data.tolist() == vectors.data.tolist()
+    with pytest.raises(TypeError):
+        vectors + 1
+    with pytest.raises(IndexError):
+        vectors[2]
+
+
 ############################################################
 ##### Une classe point matériel qui se gère en interne #####
 ############################################################
@@ -230,8 +522,17 @@ class Particle:
     pour calculer la force gravitationnelle exercée par une autre particule.
     Enfin, la méthode update lui permet de mettre à jour sa position et
     sa vitesse en fonction des forces subies.
+
+    Une fois ajoutée à un System, la particule n'en est plus qu'une vue:
+    ses attributs sont stockés dans les tableaux du système.
     """
 
+    mass = SystemAttribute('mass')
+    position = SystemAttribute('position')
+    speed = SystemAttribute('speed')
+    force = SystemAttribute('force')
+    system = index = None       # System d'appartenance et indice
+
     def __init__(self, mass=1, position=Vector(), speed=Vector()):
         """
         Le constructeur de la classe Particle.
@@ -285,11 +586,37 @@ class Particle:
         """
         try:
             r = self.position - other.position
-            self.force = -self.mass * other.mass / r.norm() ** 3 * r
+            r *= -self.mass * other.mass / r.norm() ** 3
+            self.force = r
         except AttributeError:
             raise TypeError("Tried to compute the force created by "
                             "a non-Particle object")
 
+    def potentialEnergy(self, other):
+        """
+        Calcule l'énergie potentielle gravitationnelle de self dans le champ
+        d'une Particule other.
+
+        Args :
+                other(Particle): Une autre particule, source de l'interaction
+
+        Raises :
+                TypeError si other n'est pas un objet Particle
+        """
+        try:
+            return -self.mass * other.mass / (self.position -
+                                              other.position).norm()
+        except AttributeError:
+            raise TypeError("Tried to compute the energy in the field of "
+                            "a non-Particle object")
+
+    def kineticEnergy(self):
+        """
+        Calcule l'énergie cinétique de self.
+        """
+        return 0.5 * self.mass * (self.speed.x ** 2 + self.speed.y ** 2 +
+                                  self.speed.z ** 2)
+
     def update(self, dt):
         """
         Mise à jour de la position et la vitesse au cours du temps.
@@ -298,11 +625,23 @@ class Particle:
                 dt(float): Pas de temps d'intégration.
         """
         try:
-            d = float(dt)
+            dt = float(dt)
         except (ValueError, TypeError, AttributeError):
             raise TypeError("The integration timestep must be a number")
-        self.speed += self.force * dt * (1 / self.mass)
-        self.position += self.speed * dt
+        self.kick(dt)
+        self.drift(dt)
+
+    def kick(self, dt):
+        """
+        Mise à jour de la vitesse seule (sous la force courante).
+        """
+        self.speed.axpy(dt / self.mass, self.force)
+
+    def drift(self, dt):
+        """
+        Mise à jour de la position seule (à la vitesse courante).
+        """
+        self.position.axpy(dt, self.speed)
 
 
 #############################################
@@ -360,6 +699,8 @@ class Ion(Particle):
     Coulomb.
     """
 
+    charge = SystemAttribute('charge', int)
+
     def __init__(self, mass=1, charge=1, position=Vector(), speed=Vector()):
         """
         Le constructeur de la classe Ion.
@@ -411,11 +752,29 @@ class Ion(Particle):
         """
         try:
             r = self.position - other.position
-            self.force = self.charge * other.charge / r.norm() ** 3 * r
+            r *= self.charge * other.charge / r.norm() ** 3
+            self.force = r
         except (AttributeError, TypeError, ValueError):
             raise TypeError("Tried to compute the force created by "
                             "a non-Ion object")
 
+    def potentialEnergy(self, other):
+        """
+        Calcule l'énergie potentielle électrostatique de self dans le champ
+        d'un Ion other. Masque la méthode de Particle.
+
+        Args :
+                other(Ion): Un autre Ion, source de l'interaction.
+        Raises :
+                TypeError si other n'est pas un objet Ion
+        """
+        try:
+            return self.charge * other.charge / (self.position -
+                                                 other.position).norm()
+        except (AttributeError, TypeError, ValueError):
+            raise TypeError("Tried to compute the energy in the field of "
+                            "a non-Ion object")
+
 
 #######################################
 ##### Des test pour la classe Ion #####
@@ -440,6 +799,14 @@ def test_IonStr():
         "position (1.00,2.00,3.00) and speed (-1.00,-2.00,-3.00)"
 
 
+def test_IonEnergy():
+    ion = Ion(mass=2, charge=2, position=Vector(0, 3, 4), speed=Vector(1))
+    assert ion.potentialEnergy(Ion(charge=5)) == 2
+    assert ion.kineticEnergy() == 1
+    with pytest.raises(TypeError):
+        ion.potentialEnergy(Particle())
+
+
 def test_IonForce():
     ion = Ion(mass=1, charge=1, position=Vector(1, 0, 0))
     ion2 = Ion(charge=3)
@@ -450,6 +817,1219 @@ def test_IonForce():
     assert ion.force == Vector(6 / 7, -9 / 7, 18 / 7)
 
 
+###################################################################
+##### Des schémas d'intégration symplectiques (kick et drift) #####
+###################################################################
+
+# Coefficients de Yoshida (composition d'ordre 4 du schéma de Verlet)
+YOSHIDA_W1 = 1 / (2 - 2 ** (1 / 3))
+YOSHIDA_W0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+
+# Un pas de schéma est une suite de (a, b): kick(a*dt) puis drift(b*dt)
+SCHEMES = {
+    # Euler symplectique (vitesse puis position), comme Particle.update
+    'euler': [(1, 1)],
+    # Verlet vitesse (leapfrog kick-drift-kick), d'ordre 2
+    'verlet': [(1 / 2, 1), (1 / 2, 0)],
+    # Yoshida, d'ordre 4: trois pas de Verlet de durées w1, w0, w1
+    'yoshida4': [(YOSHIDA_W1 / 2, YOSHIDA_W1),
+                 ((YOSHIDA_W1 + YOSHIDA_W0) / 2, YOSHIDA_W0),
+                 ((YOSHIDA_W0 + YOSHIDA_W1) / 2, YOSHIDA_W1),
+                 (YOSHIDA_W1 / 2, 0)],
+}
+
+
+def symplecticSteps(body, forces, dt, nsteps, method='euler'):
+    """
+    Générateur avançant body de nsteps pas dt par le schéma method, et
+    renvoyant le numéro de chaque pas effectué.  Les forces ne sont
+    recalculées que si les positions ont changé depuis le dernier calcul
+    (soit une évaluation par pas pour Verlet, trois pour Yoshida).
+
+    Args :
+            body: Objet doté de méthodes kick(dt) et drift(dt)
+            forces: Fonction (sans argument) calculant les forces
+            dt(float): Pas de temps d'intégration
+            nsteps(int): Nombre de pas
+            method(str): 'euler', 'verlet' ou 'yoshida4'
+
+    Raises :
+            ValueError si le schéma est inconnu
+    """
+    try:
+        scheme = SCHEMES[method]
+    except KeyError:
+        raise ValueError("Unknown integration method {!r}".format(method))
+    fresh = False                       # Forces à jour des positions
+    for step in range(1, nsteps + 1):
+        for a, b in scheme:
+            if not fresh:
+                forces()
+                fresh = True
+            body.kick(a * dt)
+            if b:
+                body.drift(b * dt)
+                fresh = False
+        yield step
+
+
+#################################################################
+##### Un système de N corps stocké en structure de tableaux #####
+#################################################################
+
+class System:
+    """
+    Un System de N corps stocke les masses, charges, positions, vitesses et
+    forces de ses corps dans des tableaux NumPy ((N,) ou (N, 3)), et en
+    calcule les interactions (gravitationnelles ou coulombiennes) de manière
+    vectorielle.  Les particules ajoutées deviennent des vues sur ces
+    tableaux, et restent utilisables comme auparavant.
+
+    Avec le solveur 'cell-list', l'interaction est tronquée à une distance
+    `cutoff` (et éventuellement écrantée: potentiel de Yukawa de longueur
+    `screening`), dans une boîte éventuellement périodique de côté `box`,
+    et évaluée en O(N) à l'aide d'une CellList.
+
+    Les interactions sont évaluées par blocs de `tile` corps cibles, soit
+    une mémoire en O(N * tile) plutôt qu'en O(N**2), ou bien (gravitation
+    seulement) de manière approchée en O(N log N) par un Octree de
+    Barnes-Hut, reconstruit à chaque calcul.
+    """
+
+    INTERACTIONS = ('gravity', 'coulomb')
+    SOLVERS = ('direct', 'barnes-hut', 'cell-list')
+
+    def __init__(self, particles=(), interaction=None, tile=None,
+                 solver='direct', theta=0.5, cutoff=None, screening=None,
+                 box=None):
+        """
+        Le constructeur de la classe System.
+
+        Args :
+                particles: Les particules (Particle ou Ion) du système
+                interaction(str): 'gravity' ou 'coulomb' ; par défaut,
+                        'coulomb' si toutes les particules sont des Ion
+                tile(int): Nombre de corps cibles par bloc ; par défaut,
+                        tel que les blocs comptent environ 2**20 paires
+                solver(str): 'direct' (sommation directe), 'barnes-hut'
+                        ou 'cell-list'
+                theta(float): Angle d'ouverture de Barnes-Hut
+                cutoff(float): Distance de troncature ('cell-list')
+                screening(float): Longueur d'écrantage ('cell-list') ;
+                        par défaut, pas d'écrantage
+                box(float): Côté de la boîte périodique ('cell-list') ;
+                        par défaut, pas de périodicité
+
+        Raises :
+                ValueError si l'interaction ou le solveur sont inconnus, si
+                        Barnes-Hut est demandé pour l'interaction
+                        coulombienne, si la troncature manque (ou est trop
+                        grande pour la boîte), ou si une particule appartient
+                        déjà à un système
+        """
+        particles = list(particles)
+        if interaction is None:
+            interaction = 'coulomb' if particles and \
+                all(isinstance(p, Ion) for p in particles) else 'gravity'
+        if interaction not in self.INTERACTIONS:
+            raise ValueError("Unknown interaction {!r}".format(interaction))
+        if solver not in self.SOLVERS:
+            raise ValueError("Unknown solver {!r}".format(solver))
+        if solver == 'barnes-hut' and interaction != 'gravity':
+            raise ValueError("The Barnes-Hut solver requires gravity")
+        self.interaction = interaction
+        self.tile = tile
+        self.solver, self.theta = solver, float(theta)
+        self.tree = None
+        self.cells = None
+        if solver == 'cell-list':
+            if cutoff is None:
+                raise ValueError("The cell-list solver requires a cutoff")
+            self.cells = CellList(cutoff, box)
+        self.screening = screening
+        self.mass = N.empty(0)
+        self.charge = N.empty(0)
+        self.position = N.empty((0, 3))
+        self.speed = N.empty((0, 3))
+        self.force = N.empty((0, 3))
+        self.bodies = []
+        self.extend(particles)
+
+    @classmethod
+    def fromArrays(cls, mass, position, speed=None, charge=None,
+                   interaction='gravity', ion=None, **options):
+        """
+        Construit un System à partir des tableaux des masses (N,), positions
+        et vitesses (N, 3), et éventuellement des charges (N,), ses corps
+        étant des vues Particle ou Ion selon le masque booléen ion (N,) (par
+        défaut, tous des Ion si les charges sont données).
+        Les options sont celles du constructeur.
+        """
+        system = cls(interaction=interaction, **options)
+        system.mass = N.array(mass, dtype=float)
+        system.position = N.array(position, dtype=float).reshape(-1, 3)
+        system.speed = N.zeros_like(system.position) if speed is None \
+            else N.array(speed, dtype=float).reshape(-1, 3)
+        system.charge = N.zeros(len(system.mass)) if charge is None \
+            else N.array(charge, dtype=float)
+        system.force = N.zeros_like(system.position)
+        if ion is None:
+            ion = N.full(len(system.mass), charge is not None)
+        for i in range(len(system.mass)):
+            kind = Ion if ion[i] else Particle
+            body = kind.__new__(kind)
+            body.system, body.index = system, i
+            system.bodies.append(body)
+        return system
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def __getitem__(self, i):
+        return self.bodies[i]
+
+    def extend(self, particles):
+        """
+        Ajoute des particules au système, qui en deviennent des vues.
+
+        Raises :
+                ValueError si une particule appartient déjà à un système
+        """
+        particles = list(particles)
+        if any(p.system is not None for p in particles):
+            raise ValueError("A particle already belongs to a system")
+        if not particles:
+            return
+        n = len(self.bodies)
+        self.mass = N.concatenate((self.mass, [p.mass for p in particles]))
+        self.charge = N.concatenate(
+            (self.charge, [getattr(p, 'charge', 0) for p in particles]))
+        for name in ('position', 'speed', 'force'):
+            rows = [(v.x, v.y, v.z)
+                    for v in (getattr(p, name) for p in particles)]
+            setattr(self, name, N.concatenate((getattr(self, name), rows)))
+        for i, p in enumerate(particles):
+            for name in ('mass', 'charge', 'position', 'speed', 'force'):
+                p.__dict__.pop(name, None)
+            p.system, p.index = self, n + i
+        self.bodies.extend(particles)
+
+    def add(self, particle):
+        """
+        Ajoute une particule au système, et la renvoie.
+        """
+        self.extend([particle])
+        return particle
+
+    def _coefficients(self):
+        # F_i = c_i sum_j w_j (r_i - r_j) / |r_i - r_j|**3, U = c_i w_j / r
+        if self.interaction == 'gravity':
+            return -self.mass, self.mass
+        return self.charge, self.charge
+
+    def _tiles(self):
+        n = len(self.bodies)
+        tile = self.tile or max(1, 2 ** 20 // max(n, 1))
+        for i0 in range(0, n, tile):
+            i1 = min(i0 + tile, n)
+            d = self.position[i0:i1, None, :] - self.position[None, :, :]
+            r2 = N.einsum('ijk,ijk->ij', d, d)
+            r2[N.arange(i1 - i0), N.arange(i0, i1)] = N.inf  # auto-action
+            yield i0, i1, d, r2
+
+    def _neighbours(self):
+        # Paires (i, j) de la CellList à distance r < cutoff, et (ri - rj)
+        # (image la plus proche dans une boîte périodique)
+        self.cells.build(self.position)
+        for i, j in self.cells.pairs():
+            d = self.position[i] - self.position[j]
+            if self.cells.box is not None:
+                d -= self.cells.box * N.round(d / self.cells.box)
+            r = N.sqrt(N.einsum('ij,ij->i', d, d))
+            near = r < self.cells.cutoff
+            yield i[near], j[near], d[near], r[near]
+
+    def _screened(self, r):
+        # Facteurs d'écrantage (Yukawa) de la force et du potentiel
+        if self.screening is None:
+            return 1., 1.
+        x = N.exp(-r / self.screening)
+        return x * (1 + r / self.screening), x
+
+    def computeForces(self):
+        """
+        Calcule (dans self.force) et renvoie les forces exercées sur chaque
+        corps par tous les autres.
+        """
+        if self.solver == 'barnes-hut':
+            self.tree = Octree(self.position, self.mass)
+            self.force[:] = self.tree.forces(self.theta)
+            return self.force
+        if self.solver == 'cell-list':
+            c, w = self._coefficients()
+            self.force[:] = 0
+            for i, j, d, r in self._neighbours():
+                f = c[i] * w[j] * self._screened(r)[0] / r ** 3
+                for k in range(3):
+                    self.force[:, k] += N.bincount(i, f * d[:, k], len(self))
+            return self.force
+        c, w = self._coefficients()
+        for i0, i1, d, r2 in self._tiles():
+            self.force[i0:i1] = c[i0:i1, None] * N.einsum(
+                'ij,ijk->ik', w * r2 ** -1.5, d)
+        return self.force
+
+    def potentialEnergy(self):
+        """
+        Renvoie l'énergie potentielle d'interaction totale du système.
+        """
+        if self.solver == 'barnes-hut':
+            return Octree(self.position, self.mass).potentialEnergy(
+                self.theta)
+        if self.solver == 'cell-list':
+            c, w = self._coefficients()
+            return sum(N.dot(c[i] * w[j], self._screened(r)[1] / r)
+                       for i, j, d, r in self._neighbours()) / 2
+        c, w = self._coefficients()
+        energy = 0.
+        for i0, i1, d, r2 in self._tiles():
+            energy += N.dot(c[i0:i1], N.dot(r2 ** -0.5, w))
+        return energy / 2              # chaque paire est comptée deux fois
+
+    def kineticEnergy(self):
+        """
+        Renvoie l'énergie cinétique totale du système.
+        """
+        return 0.5 * N.dot(self.mass, (self.speed ** 2).sum(axis=1))
+
+    def energy(self):
+        """
+        Renvoie l'énergie mécanique totale du système.
+        """
+        return self.kineticEnergy() + self.potentialEnergy()
+
+    def update(self, dt):
+        """
+        Met à jour les vitesses puis les positions de tous les corps, comme
+        Particle.update.
+
+        Args :
+                dt(float): Pas de temps d'intégration.
+        """
+        try:
+            dt = float(dt)
+        except (ValueError, TypeError, AttributeError):
+            raise TypeError("The integration timestep must be a number")
+        self.speed += self.force * dt / self.mass[:, None]
+        self.position += self.speed * dt
+
+    def kick(self, dt):
+        """
+        Met à jour les vitesses seules (sous les forces courantes).
+        """
+        self.speed += self.force * dt / self.mass[:, None]
+
+    def drift(self, dt):
+        """
+        Met à jour les positions seules (aux vitesses courantes).
+        """
+        self.position += self.speed * dt
+
+    def step(self, dt, method='euler'):
+        """
+        Calcule les forces et avance le système d'un pas de temps dt.
+        """
+        self.run(dt, 1, method)
+
+    def run(self, dt, nsteps, method='euler', recorder=None,
+            checkpointer=None, start=0):
+        """
+        Avance le système de nsteps pas de temps dt.
+
+        Args :
+                dt(float): Pas de temps d'intégration
+                nsteps(int): Nombre de pas
+                method(str): 'euler', 'verlet' ou 'yoshida4' (cf. SCHEMES)
+                recorder(Recorder): Si donné, reçoit à chaque pas (et
+                        initialement) les énergies (t, cinétique,
+                        potentielle, totale)
+                checkpointer(Checkpointer): Si donné, reçoit l'état du
+                        système après chaque pas
+                start(int): Numéro du pas initial (reprise)
+
+        Returns :
+                Le recorder
+        """
+        def record(step):
+            kinetic, potential = self.kineticEnergy(), self.potentialEnergy()
+            recorder.add([step * dt, kinetic, potential, kinetic + potential])
+
+        if recorder is not None:
+            record(start)
+        for step in symplecticSteps(self, self.computeForces, dt, nsteps,
+                                    method):
+            if recorder is not None:
+                record(start + step)
+            if checkpointer is not None:
+                checkpointer.save(self, start + step, dt, method)
+        return recorder
+
+    def options(self):
+        """
+        Renvoie le dictionnaire des options du constructeur du système.
+        """
+        return dict(interaction=self.interaction, tile=self.tile,
+                    solver=self.solver, theta=self.theta,
+                    cutoff=None if self.cells is None else self.cells.cutoff,
+                    box=None if self.cells is None or self.cells.box is None
+                    else self.cells.box.tolist(),
+                    screening=self.screening)
+
+    def state(self):
+        """
+        Renvoie une copie de l'état complet du système (dictionnaire de
+        tableaux): masses, charges, positions, vitesses, masque des corps
+        Ion, ainsi que l'ordre courant de la CellList, dont dépend l'ordre
+        des sommations.
+        """
+        state = dict(mass=self.mass.copy(), charge=self.charge.copy(),
+                     position=self.position.copy(), speed=self.speed.copy(),
+                     ion=N.array([isinstance(p, Ion) for p in self.bodies],
+                                 dtype=bool))
+        if self.cells is not None and self.cells.order is not None:
+            state['order'] = self.cells.order.copy()
+        return state
+
+    @classmethod
+    def fromCheckpoint(cls, filename):
+        """
+        Reconstruit un System à partir d'un point de reprise (cf.
+        Checkpointer).
+
+        Args :
+                filename(str): Le fichier `.npz` du point de reprise
+
+        Returns :
+                Le System et le dictionnaire (step, dt, method) du pas
+                atteint
+        """
+        with N.load(filename) as data:
+            system = cls.fromArrays(
+                data['mass'], data['position'], data['speed'],
+                data['charge'], ion=data['ion'],
+                **json.loads(str(data['options'])))
+            if 'order' in data:
+                system.cells.order = data['order']
+            info = dict(step=int(data['step']), dt=float(data['dt']),
+                        method=str(data['method']))
+        return system, info
+
+
+###########################################
+##### Des tests pour la classe System #####
+###########################################
+
+def test_SystemViews():
+    p = Particle(2, Vector(1, 2, 3), Vector(0, 1, 0))
+    ion = Ion(1, 3, Vector(-1, 0, 0))
+    system = System([p])
+    assert system.add(ion) is ion and system[1] is ion
+    assert system.interaction == 'gravity'
+    assert p.mass == 2 and ion.charge == 3 and 'position' not in p.__dict__
+    p.position.x = 5                    # écriture à travers la vue
+    assert system.position[0, 0] == 5
+    ion.speed = Vector(1, 1, 1)
+    assert (system.speed[1] == 1).all()
+    assert str(ion) == "Ion with mass 1.00, charge 3, " \
+        "position (-1.00,0.00,0.00) and speed (1.00,1.00,1.00)"
+    with pytest.raises(ValueError):
+        System([p])
+    with pytest.raises(ValueError):
+        System(interaction='strong')
+
+
+def test_SystemForces():
+    rng = N.random.RandomState(0)
+    for kind, interaction in ((Particle, 'gravity'), (Ion, 'coulomb')):
+        bodies = [kind(mass=m, position=Vector(*r))
+                  for m, r in zip(rng.uniform(1, 2, 20), rng.randn(20, 3))]
+        if kind is Ion:
+            for ion in bodies:
+                ion.charge = rng.randint(1, 4)
+        # Référence: sommation directe avec computeForce et potentialEnergy
+        forces, energy = [], 0.
+        for p in bodies:
+            total = Vector()
+            for other in bodies:
+                if other is not p:
+                    p.computeForce(other)
+                    total += p.force
+                    energy += p.potentialEnergy(other) / 2
+            forces.append((total.x, total.y, total.z))
+        system = System(bodies, tile=3)
+        assert system.interaction == interaction
+        assert N.allclose(system.computeForces(), forces)
+        assert N.isclose(system.potentialEnergy(), energy)
+        assert bodies[5].force == Vector(*forces[5])
+
+
+def test_SystemUpdate():
+    # Problème à deux corps: même évolution qu'avec Particle.update
+    def bodies():
+        return [Particle(1, Vector(1, 0, 0), Vector(0, 0.5, 0)),
+                Particle(1, Vector(-1, 0, 0), Vector(0, -0.5, 0))]
+    p1, p2 = bodies()
+    system = System(bodies())
+    energy = system.energy()
+    for i in range(1000):
+        p1.computeForce(p2)
+        p2.computeForce(p1)
+        p1.update(1e-3)
+        p2.update(1e-3)
+        system.step(1e-3)
+    assert system[0].position == p1.position
+    assert system[1].speed == p2.speed
+    assert abs(system.energy() - energy) < 1e-3
+
+
+#######################################################################
+##### Une liste de cellules pour les interactions à courte portée #####
+#######################################################################
+
+class CellList:
+    """
+    Une CellList range les corps dans une grille de cellules cubiques de
+    côté au moins `cutoff` (boîte périodique de côté `box`, ou domaine
+    ouvert), de sorte que les paires à distance inférieure à cutoff sont
+    à chercher parmi les 27 cellules voisines.  Seules les cellules
+    occupées sont stockées (clés triées), et l'ordre de tri précédent sert
+    de point de départ à la reconstruction: un tri adaptatif est quasi
+    linéaire lorsque peu de corps changent de cellule.
+    """
+
+    OFFSETS = N.array(list(itertools.product((-1, 0, 1), repeat=3)))
+
+    def __init__(self, cutoff, box=None):
+        """
+        Le constructeur de la classe CellList.
+
+        Args :
+                cutoff(float): Distance de troncature
+                box(float): Côté (ou côtés) de la boîte périodique
+
+        Raises :
+                ValueError si la troncature n'est pas strictement positive,
+                        ou supérieure au tiers de la boîte
+        """
+        self.cutoff = float(cutoff)
+        if self.cutoff <= 0:
+            raise ValueError("The cutoff must be strictly positive")
+        self.box = None if box is None else N.array(box, float) * N.ones(3)
+        if self.box is not None and (self.box < 3 * self.cutoff).any():
+            raise ValueError("The periodic box must be at least 3 cutoffs")
+        self.order = None
+
+    def build(self, position):
+        """
+        (Re)construit la liste pour les positions (N, 3).
+        """
+        if self.box is not None:
+            self.ncell = (self.box // self.cutoff).astype(int)
+            cell = N.floor(position / (self.box / self.ncell)).astype(int)
+            cell %= self.ncell
+        else:
+            cell = N.floor((position - position.min(axis=0)) /
+                           self.cutoff).astype(int)
+            self.ncell = cell.max(axis=0) + 1
+        key = self.key(cell)
+        if self.order is None or len(self.order) != len(key):
+            self.order = N.argsort(key, kind='stable')
+        else:                           # Tri adaptatif depuis l'ordre courant
+            self.order = self.order[N.argsort(key[self.order],
+                                              kind='stable')]
+        self.keys, self.start, self.count = N.unique(
+            key[self.order], return_index=True, return_counts=True)
+        self.cell = cell[self.order[self.start]]
+
+    def key(self, cell):
+        return (cell[:, 0] * self.ncell[1] + cell[:, 1]) * self.ncell[2] + \
+            cell[:, 2]
+
+    def pairs(self):
+        """
+        Génère, pour chacune des 27 directions, les tableaux (i, j) des
+        paires de corps distincts de cellules voisines.
+        """
+        for offset in self.OFFSETS:
+            cell = self.cell + offset
+            if self.box is not None:
+                cell %= self.ncell
+                valid = N.ones(len(cell), dtype=bool)
+            else:
+                valid = ((cell >= 0) & (cell < self.ncell)).all(axis=1)
+            key = self.key(cell)
+            b = N.minimum(N.searchsorted(self.keys, key), len(self.keys) - 1)
+            a = N.flatnonzero(valid & (self.keys[b] == key))
+            b = b[a]
+            # Produit cartésien des corps des cellules a et b
+            na, nb = self.count[a], self.count[b]
+            npairs = na * nb
+            pair = N.repeat(N.arange(len(a)), npairs)
+            local = N.arange(npairs.sum()) - \
+                N.repeat(N.cumsum(npairs) - npairs, npairs)
+            i = self.order[self.start[a][pair] + local // nb[pair]]
+            j = self.order[self.start[b][pair] + local % nb[pair]]
+            distinct = i != j
+            yield i[distinct], j[distinct]
+
+
+#############################################
+##### Des tests pour la classe CellList #####
+#############################################
+
+def test_CellList():
+    rng = N.random.RandomState(0)
+    n, box, cutoff, screening = 500, 10., 2., 1.
+    position = rng.uniform(0, box, (n, 3))
+    charge = rng.choice([-1, 1], n)
+    for periodic in (False, True):
+        system = System.fromArrays(N.ones(n), position, charge=charge,
+                                   interaction='coulomb', solver='cell-list',
+                                   cutoff=cutoff, screening=screening,
+                                   box=box if periodic else None)
+        # Référence: toutes les paires
+        d = position[:, None] - position[None]
+        if periodic:
+            d -= box * N.round(d / box)
+        r = N.sqrt((d ** 2).sum(axis=2))
+        r[N.arange(n), N.arange(n)] = 2 * cutoff      # hors troncature
+        qq = N.where(r < cutoff, charge[:, None] * charge[None], 0)
+        x = N.exp(-r / screening)
+        forces = N.einsum('ij,ijk->ik', qq * x * (1 + r / screening) / r ** 3,
+                          d)
+        assert N.allclose(system.computeForces(), forces)
+        assert N.isclose(system.potentialEnergy(), (qq * x / r).sum() / 2)
+        # Reconstruction incrémentale après un petit déplacement
+        system.position += rng.normal(0, 0.1, (n, 3))
+        forces = system.computeForces().copy()
+        system.cells.order = None
+        assert N.allclose(system.computeForces(), forces)
+    # Des Ion s'y intègrent tels quels
+    ions = [Ion(charge=1, position=Vector(x, 0, 0)) for x in (0, 1, 3)]
+    System(ions, solver='cell-list', cutoff=2.).computeForces()
+    assert ions[0].force == Vector(-1, 0, 0)
+    assert ions[2].force == Vector()
+    with pytest.raises(ValueError):
+        System(solver='cell-list', cutoff=2., box=5.)
+    with pytest.raises(ValueError):
+        System(solver='cell-list')
+
+
+############################################################
+##### Un arbre octal pour la gravitation de Barnes-Hut #####
+############################################################
+
+class Octree:
+    """
+    Un Octree est l'arbre octal (de Barnes-Hut) d'un ensemble de corps :
+    chaque noeud est un cube, découpé en 8 sous-cubes tant qu'il contient
+    plus de `leafsize` corps, et résumé par sa masse totale et son centre
+    de masse.  Les noeuds sont stockés dans des tableaux, construits niveau
+    par niveau, et l'arbre est parcouru simultanément pour tous les corps
+    cibles (par blocs), ce qui donne les forces en O(N log N).
+    """
+
+    def __init__(self, position, mass, leafsize=8, maxdepth=32):
+        """
+        Le constructeur de la classe Octree.
+
+        Args :
+                position: Positions (N, 3) des corps
+                mass: Masses (N,) des corps
+                leafsize(int): Nombre maximal de corps par feuille
+                maxdepth(int): Profondeur maximale (corps confondus)
+        """
+        self.position = pos = N.asarray(position, dtype=float)
+        self.mass = mass = N.asarray(mass, dtype=float)
+        n = len(mass)
+        lo, hi = pos.min(axis=0), pos.max(axis=0)
+        centers = [((lo + hi) / 2)[None]]
+        halves = [N.array([max((hi - lo).max() / 2, 1e-300) * (1 + 1e-12)])]
+        masses, coms, firsts, counts, children = [], [], [], [], []
+        order = []                      # Corps des feuilles, par feuille
+        nnodes, first = 1, 0
+        bodies, node = N.arange(n), N.zeros(n, dtype=int)   # niveau courant
+        for depth in range(maxdepth + 1):
+            start = nnodes - len(centers[-1])   # premier noeud du niveau
+            local = node - start
+            weight = mass[bodies]
+            m = N.bincount(local, weight, len(centers[-1]))
+            masses.append(m)
+            coms.append(N.array([N.bincount(local, weight * x, len(m))
+                                 for x in pos[bodies].T]).T / m[:, None])
+            count = N.bincount(local, minlength=len(m))
+            isleaf = (count <= leafsize) | (depth == maxdepth)
+            # Feuilles: corps rangés contigûment dans order
+            inleaf = isleaf[local]
+            leafbodies = bodies[inleaf][N.argsort(local[inleaf],
+                                                  kind='stable')]
+            order.append(leafbodies)
+            leafcount = N.where(isleaf, count, 0)
+            firsts.append(first + N.cumsum(leafcount) - leafcount)
+            counts.append(leafcount)
+            first += len(leafbodies)
+            # Subdivision des autres noeuds
+            bodies, local = bodies[~inleaf], local[~inleaf]
+            octant = ((pos[bodies] > centers[-1][local]) *
+                      [1, 2, 4]).sum(axis=1)
+            keys, child = N.unique(local * 8 + octant, return_inverse=True)
+            table = N.full((len(m), 8), -1)
+            table[keys // 8, keys % 8] = nnodes + N.arange(len(keys))
+            children.append(table)
+            if not len(keys):
+                break
+            signs = ((keys[:, None] % 8 // [1, 2, 4]) % 2) * 2 - 1
+            halves.append(halves[-1][keys // 8] / 2)
+            centers.append(centers[-1][keys // 8] +
+                           signs * halves[-1][:, None])
+            node = nnodes + child.ravel()
+            nnodes += len(keys)
+        self.center = N.concatenate(centers)
+        self.half = N.concatenate(halves)
+        self.nodemass = N.concatenate(masses)
+        self.com = N.concatenate(coms)
+        self.first = N.concatenate(firsts)
+        self.count = N.concatenate(counts)
+        self.children = N.concatenate(children)
+        self.order = N.concatenate(order)
+
+    def __len__(self):
+        return len(self.half)
+
+    def _walk(self, theta, tile=4096):
+        # Parcours simultané des cibles d'un bloc: paires (cible, noeud)
+        # acceptées (approximation monopolaire) ou (cible, corps) des
+        # feuilles ouvertes ; renvoie les contributions par bloc
+        pos, n = self.position, len(self.mass)
+        for i0 in range(0, n, tile):
+            target = N.arange(i0, min(i0 + tile, n))
+            node = N.zeros(len(target), dtype=int)
+            sources = []                # (cibles, positions, masses)
+            while len(target):
+                d = self.com[node] - pos[target]
+                r2 = N.einsum('ij,ij->i', d, d)
+                inside = (N.abs(pos[target] - self.center[node]) <=
+                          self.half[node][:, None]).all(axis=1)
+                far = ~inside & (4 * self.half[node] ** 2 < theta ** 2 * r2)
+                sources.append((target[far], self.com[node[far]],
+                                self.nodemass[node[far]]))
+                # Feuilles ouvertes: sommation directe sur leurs corps
+                leaf = ~far & (self.count[node] > 0)
+                reps = self.count[node[leaf]]
+                t = N.repeat(target[leaf], reps)
+                j = self.order[N.repeat(self.first[node[leaf]], reps) +
+                               N.arange(reps.sum()) -
+                               N.repeat(N.cumsum(reps) - reps, reps)]
+                other = j != t
+                sources.append((t[other], pos[j[other]],
+                                self.mass[j[other]]))
+                # Noeuds internes ouverts: remplacés par leurs enfants
+                inner = ~far & (self.count[node] == 0)
+                child = self.children[node[inner]]
+                keep = child >= 0
+                target = N.repeat(target[inner], 8)[keep.ravel()]
+                node = child[keep]
+            yield i0, min(i0 + tile, n), sources
+
+    def forces(self, theta=0.5):
+        """
+        Renvoie les forces gravitationnelles (N, 3) approchées, un noeud
+        étant résumé par son centre de masse si sa taille est inférieure à
+        theta fois sa distance à la cible (theta=0: sommation directe).
+        """
+        pos = self.position
+        acc = N.zeros_like(pos)
+        for i0, i1, sources in self._walk(theta):
+            for target, where, mass in sources:
+                d = where - pos[target]
+                w = mass * N.einsum('ij,ij->i', d, d) ** -1.5
+                for k in range(3):
+                    acc[i0:i1, k] += N.bincount(target - i0, w * d[:, k],
+                                                i1 - i0)
+        return self.mass[:, None] * acc
+
+    def potentialEnergy(self, theta=0.5):
+        """
+        Renvoie l'énergie potentielle gravitationnelle totale approchée.
+        """
+        pos = self.position
+        energy = 0.
+        for i0, i1, sources in self._walk(theta):
+            for target, where, mass in sources:
+                d = where - pos[target]
+                energy -= N.dot(self.mass[target],
+                                mass * N.einsum('ij,ij->i', d, d) ** -0.5)
+        return energy / 2
+
+
+###########################################
+##### Des tests pour la classe Octree #####
+###########################################
+
+def test_Octree():
+    rng = N.random.RandomState(0)
+    position = rng.randn(2000, 3) * [1, 1, 0.2]     # disque épais
+    mass = rng.uniform(1, 2, 2000)
+    direct = System.fromArrays(mass, position)
+    forces, energy = direct.computeForces().copy(), direct.potentialEnergy()
+    tree = Octree(position, mass, leafsize=4)
+    assert N.isclose(tree.nodemass[0], mass.sum())
+    assert N.allclose(tree.com[0], N.dot(mass, position) / mass.sum())
+    assert sorted(tree.order) == list(range(2000))
+    assert N.allclose(tree.forces(theta=0), forces)     # sommation directe
+    system = System.fromArrays(mass, position, solver='barnes-hut',
+                               theta=0.5)
+    error = N.linalg.norm(system.computeForces() - forces, axis=1) / \
+        N.linalg.norm(forces, axis=1)
+    assert N.median(error) < 1e-2 and error.max() < 0.1
+    assert abs(system.potentialEnergy() / energy - 1) < 5e-3
+    with pytest.raises(ValueError):
+        System(solver='barnes-hut', interaction='coulomb')
+
+
+###########################################################
+##### Un enregistreur de trajectoire à mémoire bornée #####
+###########################################################
+
+class Recorder:
+    """
+    Un Recorder enregistre un flux d'états (lignes d'un tableau de réels)
+    avec une mémoire bornée.
+
+    Les agrégats (minimum, maximum, premier et dernier état) sont mis à jour
+    sur tous les états ajoutés, mais seul un état sur `every` est stocké, ou
+    bien un échantillon aléatoire uniforme de taille fixe (`reservoir`).
+    Les états stockés le sont en mémoire ou, si `filename` est donné,
+    directement dans un fichier `.npy`.  Le dernier état ajouté fait
+    toujours partie des états stockés.
+    """
+
+    HEADER_SIZE = 128           # Taille fixe de l'en-tête .npy [octets]
+
+    def __init__(self, every=1, reservoir=None, filename=None, block=4096,
+                 seed=None):
+        """
+        Le constructeur de la classe Recorder.
+
+        Args :
+                every(int): Stockage d'un état sur every
+                reservoir(int): Si donné, taille de l'échantillon aléatoire
+                        stocké (au lieu de la décimation)
+                filename(str): Si donné, fichier .npy de stockage
+                block(int): Nombre d'états accumulés avant chaque ajout
+                seed(int): Graine aléatoire de l'échantillonnage
+
+        Raises :
+                ValueError si every, reservoir ou block ne sont pas
+                        strictement positifs
+        """
+        self.every = int(every)
+        self.reservoir = None if reservoir is None else int(reservoir)
+        self.block = int(block)
+        if self.every < 1 or self.block < 1 or \
+           (self.reservoir is not None and self.reservoir < 1):
+            raise ValueError("every, reservoir and block must be "
+                             "strictly positive")
+        self.filename = filename
+        self.random = N.random.RandomState(seed)
+
+        self.n = 0                      # Nombre d'états ajoutés
+        self.min = self.max = None      # Agrégats par colonne
+        self.first = self.last = None
+        self.stored = []                # Blocs stockés en mémoire
+        self.nstored = 0
+        self.extra = False              # Dernier état stocké en surplus
+        self.file = None
+        self.indices = None             # Indices des états du réservoir
+
+    def __len__(self):
+        return self.n
+
+    def add(self, block):
+        """
+        Ajoute les états d'un tableau (m, ncol), ou d'une ligne ncol.
+        """
+        block = N.atleast_2d(N.asarray(block, dtype=float))
+        if not len(block):
+            return
+        if self.extra:                  # Le dernier état n'est plus final
+            if self.filename is None:
+                self.stored[-1] = self.stored[-1][:-1]
+            else:
+                self.file.seek(-8 * len(self.last), 2)
+                self.file.truncate()
+            self.nstored -= 1
+            self.extra = False
+
+        if self.n == 0:
+            self.first = block[0].copy()
+            self.min, self.max = block.min(axis=0), block.max(axis=0)
+        else:
+            self.min = N.minimum(self.min, block.min(axis=0))
+            self.max = N.maximum(self.max, block.max(axis=0))
+        self.last = block[-1].copy()
+
+        if self.reservoir is not None:
+            self._sample(block)
+        else:
+            self._store(block[(-self.n) % self.every::self.every])
+        self.n += len(block)
+
+    def _store(self, rows):
+        if not len(rows):
+            return
+        if self.filename is None:
+            self.stored.append(rows.copy())
+        else:
+            if self.file is None:
+                self.file = open(self.filename, 'w+b')
+                self.file.write(self._header(0, rows.shape[1]))
+            self.file.write(N.ascontiguousarray(rows, '<f8').tobytes())
+        self.nstored += len(rows)
+
+    def _sample(self, block):
+        # Algorithme R de Vitter: l'état d'indice global j remplace un état
+        # du réservoir avec la probabilité k/(j+1)
+        k = self.reservoir
+        if self.indices is None:
+            self.sample = N.empty((k, block.shape[1]))
+            self.indices = N.empty(k, dtype=int)
+        i = max(min(k - self.n, len(block)), 0)
+        self.sample[self.n:self.n + i] = block[:i]
+        self.indices[self.n:self.n + i] = N.arange(self.n, self.n + i)
+        j = N.arange(self.n + i, self.n + len(block))
+        targets = (self.random.random_sample(len(j)) * (j + 1)).astype(int)
+        for l in N.flatnonzero(targets < k):
+            self.sample[targets[l]] = block[i + l]
+            self.indices[targets[l]] = j[l]
+
+    def _header(self, n, ncol):
+        d = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({}, {}), }}"
+        d = d.format(n, ncol).ljust(self.HEADER_SIZE - 11) + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(d)) + d.encode()
+
+    @property
+    def array(self):
+        """
+        Tableau des états stockés, par ordre d'ajout (projection en mémoire
+        du fichier, le cas échéant).
+        """
+        if self.n == 0:
+            return N.empty((0, 0))
+        if self.reservoir is not None:
+            m = min(self.n, self.reservoir)
+            order = N.argsort(self.indices[:m])
+            array = self.sample[order]
+            if self.indices[order[-1]] != self.n - 1:
+                array = N.vstack((array, self.last))
+            return array
+
+        if (self.n - 1) % self.every and not self.extra:
+            self._store(self.last[None])
+            self.extra = True
+        if self.filename is None:
+            if len(self.stored) > 1:
+                self.stored = [N.concatenate(self.stored)]
+            return self.stored[0]
+        self.file.seek(0)
+        self.file.write(self._header(self.nstored, len(self.last)))
+        self.file.seek(0, 2)
+        self.file.flush()
+        return N.load(self.filename, mmap_mode='r')
+
+    def drift(self, column):
+        """
+        Variation de la colonne entre le premier et le dernier état.
+        """
+        return self.last[column] - self.first[column]
+
+    def close(self):
+        """
+        Finalise et ferme le fichier de stockage.
+        """
+        if self.reservoir is not None and self.filename is not None:
+            N.save(self.filename, self.array)
+        if self.file is not None:
+            self.array
+            self.file.close()
+            self.file = None
+
+
+def integrate(particle, center, dt, nsteps, recorder=None, method='euler'):
+    """
+    Intègre le mouvement de particle dans le champ de center (fixe) sur
+    nsteps pas de temps dt, par le schéma method (cf. SCHEMES).
+
+    Args :
+            particle(Particle): La particule en mouvement
+            center(Particle): La source (fixe) de l'interaction
+            dt(float): Pas de temps d'intégration
+            nsteps(int): Nombre de pas
+            recorder(Recorder): Si donné, reçoit les états
+                    (t, x, y, z, vx, vy, vz, énergie) initial et successifs
+
+    Returns :
+            Le recorder
+    """
+    if recorder is not None:
+        block = N.empty((recorder.block, 8))
+        i = 0
+    steps = symplecticSteps(particle, lambda: particle.computeForce(center),
+                            dt, nsteps, method)
+    for step in itertools.chain([0], steps):     # état initial compris
+        if recorder is not None:
+            if i == len(block):
+                recorder.add(block)
+                i = 0
+            pos, speed = particle.position, particle.speed
+            block[i] = (step * dt, pos.x, pos.y, pos.z,
+                        speed.x, speed.y, speed.z,
+                        particle.kineticEnergy() +
+                        particle.potentialEnergy(center))
+            i += 1
+    if recorder is not None:
+        recorder.add(block[:i])
+    return recorder
+
+
+################################################
+##### Des tests pour Recorder et integrate #####
+################################################
+
+def test_Recorder(tmpdir):
+    data = N.random.RandomState(1).randn(1000, 3)
+    rec = Recorder(every=7)
+    for i in range(0, 1000, 64):
+        rec.add(data[i:i + 64])
+    assert len(rec) == 1000
+    assert (rec.max == data.max(axis=0)).all()
+    assert rec.drift(1) == data[-1, 1] - data[0, 1]
+    expected = N.vstack((data[::7], data[-1]))
+    assert (rec.array == expected).all()
+    filename = str(tmpdir.join("states.npy"))
+    rec2 = Recorder(every=7, filename=filename)
+    for i in range(0, 1000, 64):
+        rec2.add(data[i:i + 64])
+    rec2.add(data[:1])                  # état final, hors décimation
+    rec2.close()
+    assert (N.load(filename)[:-1] == data[::7]).all()
+    assert (N.load(filename)[-1] == data[0]).all()  # stocké à close()
+    rec3 = Recorder(reservoir=50, seed=0)
+    rec3.add(data)
+    assert len(rec3.array) == 51
+    assert N.isin(rec3.array, data).all()
+
+
+def test_integrate():
+    M = Particle(mass=1, position=Vector(1, 0, 0), speed=Vector(0, 1, 0))
+    rec = integrate(M, Particle(), 1e-3, 1000, Recorder(every=100, block=64))
+    assert len(rec) == 1001
+    assert len(rec.array) == 11
+    assert rec.array[-1, 0] == 1
+    assert rec.last[1] == M.position.x
+    assert rec.first[7] == -0.5
+    assert abs(rec.drift(7)) < 1e-3
+    assert abs(rec.max[3]) == 0 and rec.max[2] > 0.8
+
+
+def test_symplectic():
+    # Demi-orbite circulaire: les schémas d'ordre 2 et 4 sont plus précis
+    # que celui d'Euler (symplectique) à pas 10 et 50 fois plus grands
+    errors, drifts = {}, {}
+    for method, nsteps in (('euler', 2000), ('verlet', 200),
+                           ('yoshida4', 40)):
+        M = Particle(mass=1, position=Vector(1, 0, 0), speed=Vector(0, 1, 0))
+        rec = integrate(M, Particle(), math.pi / nsteps, nsteps, Recorder(),
+                        method=method)
+        errors[method] = (M.position - Vector(-1, 0, 0)).norm()
+        drifts[method] = rec.max[7] - rec.min[7]
+    assert errors['verlet'] < errors['euler'] / 5
+    assert errors['yoshida4'] < errors['euler'] / 5
+    assert drifts['yoshida4'] < drifts['verlet'] < drifts['euler'] < 1e-5
+    with pytest.raises(ValueError):
+        integrate(M, Particle(), 0.1, 1, method='rk4')
+
+
+def test_SystemRun():
+    def system():
+        return System([Particle(1, Vector(1, 0, 0), Vector(0, 0.5, 0)),
+                       Particle(1, Vector(-1, 0, 0), Vector(0, -0.5, 0))])
+    euler, other, verlet = system(), system(), system()
+    for i in range(100):
+        euler.step(1e-2)
+    other.run(1e-2, 100)
+    assert N.array_equal(euler.position, other.position)
+    rec = verlet.run(1e-2, 100, method='verlet', recorder=Recorder())
+    assert len(rec) == 101 and N.isclose(rec.array[-1, 0], 1)
+    assert abs(rec.drift(3)) < abs(euler.energy() - rec.first[3]) / 10
+
+
+#########################################################
+##### Des points de reprise écrits en tâche de fond #####
+#########################################################
+
+class Checkpointer:
+    """
+    Un Checkpointer écrit tous les `every` pas l'état complet d'un System
+    (masses, charges, positions, vitesses, options, pas, dt et schéma) dans
+    un fichier `.npz` compressé, à partir duquel `restart` reprend le
+    calcul à l'identique (bit à bit).
+
+    La boucle d'intégration ne fait que copier les tableaux: compression et
+    écriture sont faites par un fil d'exécution dédié (zlib libérant le
+    GIL).  Un seul état au plus attend d'être écrit, ce qui borne la
+    mémoire si l'écriture est plus lente que le calcul.  Chaque fichier est
+    écrit sous un nom temporaire puis renommé, de sorte qu'une interruption
+    ne laisse jamais un point de reprise corrompu.  Si `filename` contient
+    `{step}`, chaque point de reprise a son propre fichier (instantanés);
+    sinon, le fichier est remplacé à chaque écriture.
+    """
+
+    def __init__(self, filename, every=1000):
+        """
+        Le constructeur de la classe Checkpointer.
+
+        Args :
+                filename(str): Nom du fichier `.npz`, éventuellement avec
+                        `{step}` (numéro du pas)
+                every(int): Nombre de pas entre deux points de reprise
+
+        Raises :
+                ValueError si every n'est pas strictement positif
+        """
+        if every < 1:
+            raise ValueError("The checkpoint interval must be positive")
+        self.filename, self.every = filename, int(every)
+        self.written = []               # Fichiers écrits
+        self.error = None
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            filename, state = item
+            try:
+                with open(filename + '.tmp', 'wb') as f:
+                    N.savez_compressed(f, **state)
+                os.replace(filename + '.tmp', filename)
+                self.written.append(filename)
+            except Exception as error:  # Signalée dans le fil principal
+                self.error = error
+
+    def _check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, system, step, dt, method='euler', force=False):
+        """
+        Transmet au fil d'écriture une copie de l'état de system au pas
+        step, si step est un multiple de every (ou si force).
+
+        Raises :
+                L'erreur éventuelle d'une écriture précédente
+        """
+        self._check()
+        if step % self.every and not force:
+            return
+        state = system.state()
+        state.update(step=step, dt=dt, method=method,
+                     options=json.dumps(system.options()))
+        self.queue.put((self.filename.format(step=step), state))
+
+    def close(self):
+        """
+        Attend la fin des écritures en cours et arrête le fil d'écriture.
+
+        Raises :
+                L'erreur éventuelle d'une écriture
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self._check()
+
+
+def restart(filename, nsteps, recorder=None, checkpointer=None):
+    """
+    Reprend un calcul à partir d'un point de reprise et le poursuit jusqu'au
+    pas nsteps (compté depuis le début du calcul), avec les mêmes dt et
+    schéma d'intégration.
+
+    Args :
+            filename(str): Le fichier `.npz` du point de reprise
+            nsteps(int): Nombre total de pas du calcul
+            recorder(Recorder), checkpointer(Checkpointer): cf. System.run
+
+    Returns :
+            Le System au pas nsteps
+    """
+    system, info = System.fromCheckpoint(filename)
+    system.run(info['dt'], nsteps - info['step'], info['method'],
+               recorder, checkpointer, start=info['step'])
+    return system
+
+
+def test_Checkpointer(tmpdir):
+    def system(solver):
+        rng = N.random.RandomState(3)
+        return System.fromArrays(rng.uniform(1, 2, 60),
+                                 rng.uniform(0, 6, (60, 3)),
+                                 rng.randn(60, 3) * 0.1, rng.choice(
+                                     [-1, 1], 60), interaction='coulomb',
+                                 solver=solver, cutoff=1.5, box=6)
+    for solver in ('direct', 'cell-list'):
+        reference = system(solver)
+        reference.run(1e-3, 40, method='verlet')
+        filename = str(tmpdir.join(solver + "_{step}.npz"))
+        ckpt = Checkpointer(filename, every=15)
+        system(solver).run(1e-3, 20, method='verlet', checkpointer=ckpt)
+        ckpt.close()
+        assert ckpt.written == [filename.format(step=15)]
+        rec = Recorder()
+        resumed = restart(ckpt.written[0], 40, recorder=rec)
+        assert isinstance(resumed[0], Ion)
+        assert N.array_equal(resumed.position, reference.position)
+        assert N.array_equal(resumed.speed, reference.speed)
+        assert len(rec) == 26 and N.isclose(rec.last[0], 0.04)
+
+    def mixed():                        # Ions et particules neutres
+        rng = N.random.RandomState(4)
+        return System([Ion(charge=int(rng.randint(1, 3)),
+                           position=Vector(*rng.uniform(0, 6, 3)))
+                       if k % 3 else Particle(position=Vector(
+                           *rng.uniform(0, 6, 3))) for k in range(12)],
+                      interaction='coulomb')
+    reference = mixed()
+    reference.run(1e-3, 40)
+    ckpt = Checkpointer(str(tmpdir.join("mixed.npz")), every=15)
+    mixed().run(1e-3, 20, checkpointer=ckpt)
+    ckpt.close()
+    resumed = restart(ckpt.written[0], 40)
+    assert [type(p) for p in resumed] == [type(p) for p in reference]
+    assert N.array_equal(resumed.charge, reference.charge)
+    assert N.array_equal(resumed.position, reference.position)
+    assert N.array_equal(resumed.speed, reference.speed)
+    ckpt = Checkpointer(str(tmpdir.join("missing", "state.npz")))
+    ckpt.save(reference, 0, 1e-3)
+    with pytest.raises(OSError):
+        ckpt.close()
+
+
 ###########################
 ##### Un main de test #####
 ###########################
@@ -467,6 +2047,8 @@ if __name__ == '__main__':
     test_VectorMul()
     test_VectorNorm()
     test_VectorClone()
+    test_VectorInPlace()
+    test_VectorArray()
     print("ok")
     print("Testing Particle class...", end=' ')
     test_ParticleInit()
@@ -477,8 +2059,16 @@ if __name__ == '__main__':
     print("Testing Ion class...", end=' ')
     test_IonInit()
     test_IonStr()
+    test_IonEnergy()
     test_IonForce()
     print("ok")
+    print("Testing System class...", end=' ')
+    test_SystemViews()
+    test_SystemForces()
+    test_SystemUpdate()
+    test_SystemRun()
+    test_symplectic()
+    print("ok")
     print(" Test end ".center(50, "*"), "\n")
 
     # Un petit calcul physique
@@ -491,10 +2081,20 @@ if __name__ == '__main__':
     M = Particle(mass=1, position=Vector(1, 0, 0), speed=Vector(0, 1, 0))
     print("** Gravitationnal computation of central-force motion for a {}" \
         .format(str(M)))
-    for i in range(ntimesteps):
-        M.computeForce(center)
-        M.update(dt)
+    rec = integrate(M, center, dt, ntimesteps, Recorder(every=1000))
     print("\t => Final system : {}".format(str(M)))
+    print("\t => Energy in [{:.6f}, {:.6f}], drift {:.2e} "
+          "({} states stored)".format(rec.min[7], rec.max[7], rec.drift(7),
+                                      len(rec.array)))
+    # mêmes calculs par des schémas symplectiques d'ordre supérieur
+    for method, factor in (('verlet', 100), ('yoshida4', 500)):
+        M = Particle(mass=1, position=Vector(1, 0, 0), speed=Vector(0, 1, 0))
+        nsteps = round(ntimesteps / factor)     # même durée totale
+        rec = integrate(M, center, ntimesteps * dt / nsteps, nsteps,
+                        Recorder(), method=method)
+        print("\t => {} with {} steps: final position {}, "
+              "energy drift {:.2e}".format(method, nsteps, M.position,
+                                           rec.drift(7)))
 
     # problème à force centrale électrostatique, cas rectiligne
     center = Ion()
@@ -506,4 +2106,22 @@ if __name__ == '__main__':
         M.update(dt)
     print("\t => Final system : {}".format(str(M)))
 
+    # Binaire (System), interrompu puis repris depuis un point de reprise
+    import tempfile
+    print("** Checkpointed binary system, restarted half-way")
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = System([Particle(1, Vector(1, 0, 0), Vector(0, 0.5, 0)),
+                         Particle(1, Vector(-1, 0, 0), Vector(0, -0.5, 0))])
+        ckpt = Checkpointer(os.path.join(tmp, "binary.npz"),
+                            every=ntimesteps // 2)
+        binary.run(dt, ntimesteps // 2 + 1, method='verlet',
+                   checkpointer=ckpt)
+        ckpt.close()
+        resumed = restart(ckpt.written[-1], ntimesteps)
+    binary.run(dt, ntimesteps - ntimesteps // 2 - 1, method='verlet',
+               start=ntimesteps // 2 + 1)
+    print("\t => Final system : {}".format(str(resumed[0])))
+    print("\t => Identical to the uninterrupted run: {}".format(
+        N.array_equal(resumed.position, binary.position)))
+
     print(" Physical computations end ".center(50, "*"))